@@ -7,21 +7,142 @@
 import re
 import os
 import sys
+import json
 import subprocess
 import errno
+import fnmatch
+import hashlib
 
 import pywikibot
 
 import doxymwglobal
+import doxymwparallel
+import doxymwxml
+import doxymwexport
 from doxymwsite import DoxyMWSite
-from doxymwpage import DoxygenHTMLPage
+from doxymwbackend import DoxyMWPywikibotBackend
+from doxymwfakewiki import DoxyMWFakeWiki
+from doxymwmetrics import metrics
+from doxymwpage import DoxyMWTitle, DoxygenHTMLPage, DoxygenLinkIndex
+
+#Reads the tags out of the text of a doxygen config file
+#Later values of a tag replace earlier ones (+= appends) just like doxygen does
+#If included is a list, files pulled in with @INCLUDE are read in place (searched for in @INCLUDE_PATH if they aren't
+#in the current directory) and their paths are added to it
+#Returns a dictionary of tag to list of values
+def parseDoxygenConfig(config, included=None):
+    params = {}
+    _parseDoxygenConfigInto(params, config, included)
+    return params
+
+def _parseDoxygenConfigInto(params, config, included):
+    #Join continued lines
+    config = re.sub("\\\\[ \t]*\r?\n", " ", config)
+    for line in config.splitlines():
+        line = line.strip()
+        #Comments
+        if len(line) == 0 or line[0] == "#":
+            continue
+        
+        match = re.match("([A-Za-z0-9_@]+)\\s*(\\+?=)(.*)", line)
+        if match:
+            k, op, v = match.group(1,2,3)
+            values = [value.strip("\"") for value in re.findall("\"[^\"]*\"|\\S+", v)]
+            if k == "@INCLUDE" and included is not None:
+                for value in values:
+                    path = findDoxygenInclude(value, params.get("@INCLUDE_PATH", []))
+                    #Doxygen would fail on an include it can't find, so it's left for doxygen to report
+                    if path and path not in included:
+                        included.append(path)
+                        with open(path) as fp:
+                            _parseDoxygenConfigInto(params, fp.read(), included)
+            elif op == "+=":
+                params[k] = params.get(k, []) + values
+            else:
+                params[k] = values
+
+#Finds a file from a doxygen @INCLUDE, None if it isn't there
+def findDoxygenInclude(name, includePath):
+    for dir in ["."] + includePath:
+        path = os.path.abspath(os.path.join(dir, name))
+        if os.path.isfile(path):
+            return path
+    return None
+
+#Tags naming files doxygen reads besides the inputs (and the config files), they change the output too
+doxygenConfigFileTags = ("HTML_HEADER", "HTML_FOOTER", "HTML_STYLESHEET", "HTML_EXTRA_STYLESHEET", "HTML_EXTRA_FILES", "LAYOUT_FILE")
+
+#Finds the files the parsed config points doxygen to that aren't inputs
+def findDoxygenConfigFiles(params):
+    return [os.path.abspath(path) for tag in doxygenConfigFileTags for path in params.get(tag, [])]
+
+#Finds all the files doxygen will read given the parsed config
+def findDoxygenInputs(params):
+    #Doxygen's defaults for when these aren't set
+    inputs = params.get("INPUT") or ["."]
+    recursive = params.get("RECURSIVE", ["NO"]) == ["YES"]
+    patterns = params.get("FILE_PATTERNS") or ["*.c", "*.cc", "*.cxx", "*.cpp", "*.c++", "*.java", "*.ii", "*.ixx", "*.ipp", "*.i++",
+        "*.inl", "*.idl", "*.ddl", "*.odl", "*.h", "*.hh", "*.hxx", "*.hpp", "*.h++", "*.cs", "*.d", "*.php", "*.php4", "*.php5",
+        "*.phtml", "*.inc", "*.m", "*.markdown", "*.md", "*.mm", "*.dox", "*.py", "*.f90", "*.f", "*.for", "*.tcl", "*.vhd",
+        "*.vhdl", "*.ucf", "*.qsf", "*.as", "*.js"]
+    excludes = [os.path.abspath(path) for path in params.get("EXCLUDE", [])]
+    excludePatterns = params.get("EXCLUDE_PATTERNS", [])
+    
+    def wanted(path):
+        name = os.path.basename(path)
+        return (any(fnmatch.fnmatch(name, pattern) for pattern in patterns) and
+            not any(fnmatch.fnmatch(path, pattern) for pattern in excludePatterns))
+    
+    files = []
+    for input in inputs:
+        input = os.path.abspath(input)
+        if os.path.isfile(input):
+            files.append(input)
+            continue
+        for root, dirs, names in os.walk(input):
+            if root in excludes:
+                dirs[:] = []
+                continue
+            if not recursive:
+                dirs[:] = []
+            for name in names:
+                path = os.path.join(root, name)
+                if path not in excludes and wanted(path):
+                    files.append(path)
+    return sorted(files)
+
+#Fingerprint of everything that decides what doxygen generates
+#The effective config, the doxygen binary and the path, size and modification time of every input
+#files has everything else doxygen reads, the included config files, headers, footers, stylesheets, layout, ...
+def fingerprintDoxygenRun(config, binary, inputs, files=()):
+    sha1 = hashlib.sha1()
+    sha1.update(config.encode("utf-8"))
+    for path in [binary] + inputs + list(files):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            sha1.update((path + "|missing\n").encode("utf-8"))
+            continue
+        sha1.update((path + "|" + str(stat.st_size) + "|" + str(stat.st_mtime) + "\n").encode("utf-8"))
+    return sha1.hexdigest()
+
+#Fingerprint of what doxygen generated in path, the name, size and modification time of every file
+#so output that was deleted or changed since doxygen ran gets generated again
+def fingerprintDoxygenOutput(path):
+    sha1 = hashlib.sha1()
+    for root, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            filePath = os.path.join(root, name)
+            stat = os.stat(filePath)
+            sha1.update((os.path.relpath(filePath, path) + "|" + str(stat.st_size) + "|" + str(stat.st_mtime) + "\n").encode("utf-8"))
+    return sha1.hexdigest()
 
 #Calls doxygen using a config file and outputs everything to a temporary path
+#Skips running doxygen if nothing changed since the last time it ran
 def generateDoxygenHTMLDocs():
     #Try the config file
     with open(doxymwglobal.config["doxygen_configPath"]) as fp:
-        configLines = fp.readlines()
-        fp.seek(0)
         config = fp.read()
         
         #Parameters we must force to generate proper, small, output
@@ -34,6 +155,7 @@ def generateDoxygenHTMLDocs():
         "HTML_OUTPUT"            : "html",
         "HTML_FILE_EXTENSION"    : ".html",
         "HIDE_COMPOUND_REFERENCE": "YES", #Cleaner titles
+        "HTML_TIMESTAMP"         : "NO", #Otherwise every page changes every run
 
         #Disabling specific HTML sections
         #Possibly critical, makes HTML easier to work with
@@ -57,6 +179,17 @@ def generateDoxygenHTMLDocs():
         "GENERATE_AUTOGEN_DEF"   : "NO",
         "GENERATE_PERLMOD"       : "NO"
         }
+        
+        #The XML reader only needs the XML output
+        readerOutput = "html"
+        if doxymwglobal.config["doxygen_reader"] == "xml":
+            readerOutput = "xml"
+            params["doxygen_paramsForce"].update({
+            "GENERATE_HTML"          : "NO",
+            "GENERATE_XML"           : "YES",
+            "XML_OUTPUT"             : "xml",
+            "XML_PROGRAMLISTING"     : "NO" #Source listings aren't used and are most of the output
+            })
 
         #Parameters we warn about but do not enforce
         params["doxygen_paramsWarn"] = {
@@ -64,98 +197,160 @@ def generateDoxygenHTMLDocs():
         }
         
         
-        #Read each line for params to warn about
+        #Warn about specific parameters
         warnParams = params["doxygen_paramsWarn"]
-        for line in configLines:
-            #Comments
-            if line[0] == "#":
-                continue
-            
-            match = re.match('\s*(\S+)\s*=\s+(\S*)', line)
-            if match:
-                k, v = match.group(0,1)
-                
-                #Warn about specific parameters
-                for warn in warnParams.keys():
-                    if k == warn and v != warnParams[warn]:
-                        doxymwglobal.msg(doxymwglobal.warning, "Doxygen config has parameter " + warn + " not set to " + warnParams[warn] + " which may cause problems.")
+        userParams = parseDoxygenConfig(config, [])
+        for warn in warnParams.keys():
+            if warn in userParams and userParams[warn] != [warnParams[warn]]:
+                doxymwglobal.msg(doxymwglobal.msgType.warning, "Doxygen config has parameter " + warn + " not set to " + warnParams[warn] + " which may cause problems.")
                 
         #Append the force tags to the end (overwrite the other values)
         forceParams = params["doxygen_paramsForce"]
         for force in forceParams.keys():
             config += "\n" + force + " = " + forceParams[force]
         
+        #Skip doxygen if the effective config, all the inputs and the output are the same as the last time it ran
+        #The fingerprint file has the fingerprint of the run on the first line and of the output on the second
+        binary = doxymwglobal.config["doxygen_binaryPath"] + "/doxygen.exe"
+        included = []
+        effectiveParams = parseDoxygenConfig(config, included)
+        inputs = findDoxygenInputs(effectiveParams)
+        fingerprint = fingerprintDoxygenRun(config, binary, inputs, included + findDoxygenConfigFiles(effectiveParams))
+        fingerprintPath = doxymwglobal.config["doxygen_tmpPath"] + "/doxygen.fingerprint"
+        outputPath = doxymwglobal.config["doxygen_tmpPath"] + "/" + readerOutput
+        if not doxymwglobal.option["force"] and os.path.isdir(outputPath) and os.path.isfile(fingerprintPath):
+            with open(fingerprintPath) as fp:
+                lastFingerprint = fp.read().split("\n")
+            if lastFingerprint[0] == fingerprint and lastFingerprint[1:2] == [fingerprintDoxygenOutput(outputPath)]:
+                metrics.count("doxygen", "skipped")
+                doxymwglobal.msg(doxymwglobal.msgType.info, "Doxygen inputs and output unchanged, not running doxygen")
+                return
+        
+        #Give bigger projects more time
+        timeout = None
+        if doxymwglobal.config["doxygen_timeout"]:
+            timeout = doxymwglobal.config["doxygen_timeout"] + doxymwglobal.config["doxygen_timeoutPerFile"] * len(inputs)
+        
         #Call doxygen, piping the config to it
-        with subprocess.Popen([doxymwglobal.config["doxygen_binaryPath"] + "/doxygen.exe", "-"], stdin=subprocess.PIPE, universal_newlines=True) as proc:
-            proc.communicate(input=config, timeout=20)
+        try:
+            os.remove(fingerprintPath) #Output is about to change
+        except OSError:
+            pass
+        with subprocess.Popen([binary, "-"], stdin=subprocess.PIPE, universal_newlines=True) as proc:
+            try:
+                proc.communicate(input=config, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                doxymwglobal.msg(doxymwglobal.msgType.error, "Doxygen took longer than " + str(timeout) + " seconds for " + str(len(inputs)) + " input files, increase doxygen_timeout")
+        
+        if proc.returncode != 0:
+            doxymwglobal.msg(doxymwglobal.msgType.error, "Doxygen failed with exit code " + str(proc.returncode))
+        
+        with open(fingerprintPath, "w") as fp:
+            fp.write(fingerprint + "\n" + fingerprintDoxygenOutput(outputPath))
             
         #Return after finished
 
+#Returns a function that gives the type of a Doxygen HTML file from its name (without .html), None if we don't want it
+#doxygen_otherFiles and doxygen_filePrefixes are put together in one pattern where every rule is tried from the start
+#of the name in order, so the first rule that matches (not the earliest match in the name) decides the type
+def makeDoxygenClassifier():
+    types = [("^" + re.escape(other) + "$", "OTHER") for other in doxymwglobal.config["doxygen_otherFiles"]]
+    types.extend(doxymwglobal.config["doxygen_filePrefixes"].items())
+    pattern = re.compile("|".join("(?=.*?(?:" + regex + "))(?P<type" + str(i) + ">)" for i, (regex, type) in enumerate(types)))
+    
+    def classify(name):
+        match = pattern.match(name)
+        if not match:
+            return None
+        return types[int(match.lastgroup[4:])][1]
+    return classify
+
+#Lists the Doxygen HTML docs under path (and its subdirectories) without looking at any file but the directories
+#Returns a tuple of
+# + A dict of every directory to the list of (filename, type) of the docs in it
+# + A dict of every directory to its modification time, which changes whenever a file is added or removed in it
+def scanDoxygenHTMLDocs(path):
+    classify = makeDoxygenClassifier()
+    docs = {}
+    dirs = {}
+    pending = [path]
+    while len(pending) > 0:
+        dirPath = pending.pop()
+        dirs[dirPath] = os.stat(dirPath).st_mtime_ns
+        dirDocs = []
+        with os.scandir(dirPath) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.endswith(".html"):
+                    type = classify(name[:-5])
+                    if type:
+                        dirDocs.append((name, type))
+                elif entry.is_dir():
+                    pending.append(entry.path)
+        docs[dirPath] = sorted(dirDocs)
+    return (docs, dirs)
+
+#Finds the doxygen documents at the specified path we want to make pages for
+#Which files we want and their types come from doxygen_otherFiles and doxygen_filePrefixes
+#The listing is kept in doxygen_listingCachePath and used again while none of the directories changed
+#Returns a list of (filepath, filename, type) tuples
+def findDoxygenHTMLDocs():
+    path = os.path.abspath(doxymwglobal.config["doxygen_tmpPath"] + "/html")
+    if not os.path.isdir(path):
+        return []
+    
+    #The cache is only good for the same directory and the same rules
+    rules = [doxymwglobal.config["doxygen_otherFiles"], [list(rule) for rule in doxymwglobal.config["doxygen_filePrefixes"].items()]]
+    cachePath = doxymwglobal.config["doxygen_listingCachePath"]
+    listing = None
+    if cachePath and not doxymwglobal.option["force"] and os.path.isfile(cachePath):
+        try:
+            with open(cachePath, "rt") as fp:
+                listing = json.load(fp)
+        except ValueError:
+            doxymwglobal.msg(doxymwglobal.msgType.info, "Listing cache " + cachePath + " is corrupt, listing the docs again")
+        
+        def unchanged(dirPath, mtime):
+            try:
+                return os.stat(dirPath).st_mtime_ns == mtime
+            except OSError:
+                return False
+        if listing and (listing["path"] != path or listing["rules"] != rules
+            or not all(unchanged(dirPath, mtime) for dirPath, mtime in listing["dirs"].items())):
+            listing = None
+    
+    if listing:
+        metrics.count("discovery", "cached")
+    else:
+        docs, dirs = scanDoxygenHTMLDocs(path)
+        listing = {"path" : path, "rules" : rules, "dirs" : dirs, "docs" : docs}
+        if cachePath:
+            dirPath = os.path.dirname(cachePath)
+            if dirPath and not os.path.isdir(dirPath):
+                os.makedirs(dirPath)
+            with open(cachePath, "wt") as fp:
+                json.dump(listing, fp)
+    
+    return [(dirPath, name, type) for dirPath in sorted(listing["docs"]) for name, type in listing["docs"][dirPath]]
+
 #Reads the doxygen documents at the specified path and returns a list of wikiPages
+#Every page is held in memory at once, main streams them instead
 def readDoxygenHTMLDocs():
     #List of all the actual wiki pages
     wikiPages = []
-    
-    #Doxygen generates all it's files with prefixes by type
-    #This is not an exhaustive list, some configuration patterns have not been tested
-    #Files, prefix "_"
-    #Interfaces, prefix "interface_"
-    #Namespaces, prefix "namespace_"
-    #Classes, prefix "class_"
-    #Members lists, suffix "-members"
-    params = {}
-    params["doxygen_filePrefixes"] = {
-        "-members$" : "MEMBERS", #Match members lists first
-        "^_" : "FILE",
-        "^namespace_" : "NAMESPACE",
-        "^class_" : "CLASS",
-        "^interface_" : "INTERFACE"
-    }
-
-    #Other files we want (useful and don't provide redundancies to MediaWiki functionality)
-    #Class hierarchy, hierarchy.html
-    params["doxygen_otherFiles"] = [
-        "hierarchy"
-    ]
-    
-    for root, dirs, files in os.walk(doxymwglobal.config["doxygen_tmpPath"] + "/html"):
-        for file in files:
-            #Get all the file info
-            fileAbs = os.path.abspath(root + "\\" + file)
-            fileAbsPath, t = os.path.split(fileAbs)
-            fileRel = "./" + os.path.relpath(fileAbs, doxymwglobal.config["doxygen_tmpPath"])
-            fileRelPath, fileTail = os.path.split(fileRel)
-            fileName, fileExt = os.path.splitext(fileTail)
-            
-            #Filter out by extension
-            if fileExt != ".html":
-                continue
-       
-            #Check special files and type
-            fileDoxyType = None
-            #Special ("other") files
-            for other in params["doxygen_otherFiles"]:
-                if fileName == other:
-                    fileDoxyType = "OTHER"
-                    break
-            
-            #Check type
-            if not fileDoxyType:
-                for regex, type in params["doxygen_filePrefixes"].items():
-                    if re.search(regex, fileName):
-                        fileDoxyType = type
-                        break
-            
-            #Filter out the html files without type
-            if fileDoxyType == None:
-                continue
-            
-            
-            #Make the doxygen wiki page object
-            page = DoxygenHTMLPage(fileAbsPath, fileTail, fileDoxyType)
-            wikiPages.append(page)
+    for fileAbsPath, fileTail, fileDoxyType in findDoxygenHTMLDocs():
+        #Make the doxygen wiki page object
+        page = DoxygenHTMLPage(fileAbsPath, fileTail, fileDoxyType)
+        wikiPages.append(page)
     return wikiPages
     
+#Writes the metrics of this run where the config says to
+def writeMetrics():
+    if doxymwglobal.config["metrics_path"]:
+        metrics.write(doxymwglobal.config["metrics_path"])
+    
 def main():
     #( 0 ) Get opts
     from doxymwglobal import option #Default opts
@@ -166,7 +361,7 @@ def main():
         
     option["command"] = sys.argv[1]
     
-    if option["command"] != "cleanup" and option["command"] != "update":
+    if option["command"] not in ("cleanup", "update", "export"):
         doxymwglobal.msg(doxymwglobal.msgType.error, "Invalid command specified", usage=True)
     
     #Argv[2:] must be other flags
@@ -175,6 +370,10 @@ def main():
             option["interactive"] = True
         elif arg == "-w" or arg == "--warnIsError":
             option["warnIsError"] = True
+        elif arg == "-f" or arg == "--force":
+            option["force"] = True
+        elif arg == "-r" or arg == "--resume":
+            option["resume"] = True
         elif arg == "-h" or arg == "--help":
             printHelp()
             return
@@ -197,22 +396,58 @@ def main():
                     option["printLevel"] = doxymwglobal.msgType[printLevel.lower()]
                 except KeyError:
                     doxymwglobal.msg(doxymwglobal.msgType.error, "Invalid printLevel " + printLevel, usage=True)
+        
+        elif arg.find("-s:") == 0 or arg.find("--shards:") == 0:
+            shards = arg.split(":")[1]
+            try:
+                option["shards"] = int(shards)
+            except ValueError:
+                option["shards"] = 0
+            if option["shards"] < 1:
+                doxymwglobal.msg(doxymwglobal.msgType.error, "Invalid shards " + shards, usage=True)
+        
+        elif arg.find("-j:") == 0 or arg.find("--jobs:") == 0:
+            jobs = arg.split(":")[1]
+            try:
+                option["jobs"] = int(jobs)
+            except ValueError:
+                option["jobs"] = 0
+            if option["jobs"] < 1:
+                doxymwglobal.msg(doxymwglobal.msgType.error, "Invalid jobs " + jobs, usage=True)
                     
         else:
             doxymwglobal.msg(doxymwglobal.msgType.error, "Invalid option", usage=True)
     
     #Do the actual operation
-    if option["command"] == "update":
+    if option["command"] == "update" or option["command"] == "export":
         #( 1 ) Generate the doxygen docs
-        generateDoxygenHTMLDocs()
+        with metrics.phase("doxygen"):
+            generateDoxygenHTMLDocs()
         
         #( 2 )Sort through all files and get the ones we want to parse
-        wikiPages = readDoxygenHTMLDocs()
+        with metrics.phase("discovery"):
+            if doxymwglobal.config["doxygen_reader"] == "xml":
+                docs = doxymwxml.findDoxygenXMLDocs()
+            else:
+                docs = findDoxygenHTMLDocs()
+        metrics.count("discovery", "pages", len(docs))
+        
+        #First pass only keeps the titles (and anchors) so pages can link to each other
+        #"OTHER" pages go in every info box so we keep a title only page for those
+        linkIndex = DoxygenLinkIndex()
+        otherPages = []
+        for doc, title, anchors in metrics.timed("indexing", doxymwparallel.indexDocs(docs, option["jobs"])):
+            fileAbsPath, fileTail, fileDoxyType = doc
+            normtitle = DoxyMWTitle(title, avoid=False)
+            linkIndex.add(fileTail, normtitle.title, anchors)
+            if fileDoxyType == "OTHER":
+                page = DoxygenHTMLPage(fileAbsPath, fileTail, fileDoxyType, extract=False)
+                page.setTitle(title)
+                otherPages.append(page)
         
         #( 3 )Ready the page by getting everything into valid wiki markup
-        for page in wikiPages:
-            doxymwglobal.msg(doxymwglobal.msgType.info, "Converting " + page.filename)
-            page.convert(wikiPages)
+        #This is a generator, pages are converted one at a time as they're needed
+        wikiPages = metrics.timed("conversion", doxymwparallel.convertDocs(docs, linkIndex, option["jobs"]))
         
         #Debug the first portion, outputs everything to an html file
         if "doxygen" in option["debug"]:
@@ -222,18 +457,47 @@ def main():
                 fp = open(debugPath + "/" + page.filename, 'w', errors="replace")
                 strr = page.mwtitle+"<br><br>"+page.mwcontents
                 fp.write(strr)
+            linkIndex.report()
+            writeMetrics()
+            return
+        
+        #Exporting doesn't need the wiki at all
+        if option["command"] == "export":
+            doxymwexport.exportPages(doxymwparallel.prefetch(wikiPages, doxymwglobal.config["doxygen_convertAhead"]), otherPages)
+            linkIndex.report()
+            writeMetrics()
+            doxymwglobal.msg(doxymwglobal.msgType.info, "Done")
             return
 
     #( 4 )Perform all the wiki tasks
     #Make sure we're logged in
-    site = pywikibot.Site()
+    #The fake wiki is the same wiki for every user
+    fakeWiki = None
+    if doxymwglobal.config["mediaWiki_backend"] == "fake":
+        fakeWiki = DoxyMWFakeWiki(doxymwglobal.config["mediaWiki_fakeWikiPath"], doxymwglobal.config["mediaWiki_fakeWikiLatency"])
+    def makeBackend(user=None):
+        backend = fakeWiki if fakeWiki else DoxyMWPywikibotBackend(pywikibot.Site(user=user))
+        if backend not in metrics.backends:
+            metrics.backends.append(backend)
+        return backend
     
     #Make a site, run the command
-    site = DoxyMWSite(site)
+    site = DoxyMWSite(makeBackend())
     if option["command"] == "cleanup":
         site.cleanup()    
     if option["command"] == "update":
-        site.update(wikiPages)
+        #Every shard gets its own login
+        shardSites = None
+        if option["shards"] > 1:
+            users = doxymwglobal.config["mediaWiki_shardUsers"]
+            shardSites = [DoxyMWSite(makeBackend(users[i % len(users)] if users else None)) for i in range(option["shards"])]
+        
+        #Conversion keeps going in the background while pages are being uploaded
+        site.update(doxymwparallel.prefetch(wikiPages, doxymwglobal.config["doxygen_convertAhead"]), otherPages, shardSites)
+        linkIndex.report()
+    for backend in metrics.backends:
+        backend.report()
+    writeMetrics()
         
     #( 5 ) We're done!
     doxymwglobal.msg(doxymwglobal.msgType.info, "Done")
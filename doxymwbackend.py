@@ -0,0 +1,228 @@
+import collections
+import threading
+
+import pywikibot
+from pywikibot import pagegenerators
+from pywikibot.data import api
+
+import doxymwglobal
+
+#Everything DoxyMWBot needs from a wiki, so the wiki can be swapped out (see doxymwfakewiki for one that isn't real)
+#Pages handed out only have to act like a pywikibot.Page for the parts the strategies use
+#(title, exists, isRedirectPage, get, text, save, delete, latest_revision_id, categories and for files latest_file_info)
+#Counts the requests that go through it in requests, keyed by the kind of request
+#(login, query, list, edit, delete, upload, purge), every backend counts the same requests the same way
+class DoxyMWBackend(object):
+    requestKinds = ("login", "query", "list", "edit", "delete", "upload", "purge")
+    listLimit = 500 #Results per list request (and continuation), what the API gives non-bots
+    
+    def __init__(self):
+        self.requests = collections.Counter()
+        self.requestsLock = threading.Lock() #Requests come from the worker threads
+
+    def count(self, request, n=1):
+        with self.requestsLock:
+            self.requests[request] += n
+    
+    #Yields everything in items, counting a list request for every listLimit of them (continuations)
+    def countedList(self, items):
+        self.count("list")
+        n = 0
+        for item in items:
+            n += 1
+            if n > self.listLimit:
+                self.count("list")
+                n = 1
+            yield item
+
+    #Logs the requests that went through this backend
+    def report(self):
+        for request, n in sorted(self.requests.items()):
+            doxymwglobal.msg(doxymwglobal.msgType.info, str(n) + " " + request + " requests")
+
+    def login(self):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #The name of the user we're logged in as
+    def user(self):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #A page for the title, not loaded yet
+    def page(self, title):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #A file page for the title (without "File:"), not loaded yet
+    def filePage(self, title):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #Generator of the pages for the titles, whether they exist or not
+    def pages(self, titles):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #Generator of all the subcategories of category (title with "Category:"), recursively
+    def subcategories(self, category):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #Generator of all the pages in category (title with "Category:"), existence and redirect status already loaded
+    def categoryMembers(self, category):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #The sha1s of all the files in category (title with "Category:") keyed by file title
+    def fileSha1s(self, category):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #Loads the text, existence and redirect status of all the pages, batchSize pages per request
+    def preload(self, pages, batchSize):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #Uploads the file at path to filePage, comment is also the description of new files
+    def upload(self, filePage, path, comment):
+        raise NotImplementedError("Abstract method should be implemented")
+
+    #Purges the cache of all the pages with the given titles in one request, returns whether it worked
+    def purge(self, titles, forceLinkUpdate=False):
+        raise NotImplementedError("Abstract method should be implemented")
+
+#A pywikibot.Page that counts the requests it sends through its backend
+#Everything the strategies don't use goes straight to the page
+#pywikibot loads a page the first time it's asked about it, the backend marks pages it already loaded (listings, preload)
+class DoxyMWPywikibotPage(object):
+    def __init__(self, backend, page, infoLoaded=False, textLoaded=False):
+        self.backend = backend
+        self.page = page
+        self.infoLoaded = infoLoaded #Existence and redirect status
+        self.textLoaded = textLoaded
+    
+    def __getattr__(self, name):
+        return getattr(self.page, name)
+    
+    def __str__(self):
+        return str(self.page)
+    
+    def _loadInfo(self):
+        if not self.infoLoaded:
+            self.backend.count("query")
+            self.infoLoaded = True
+    
+    def exists(self):
+        self._loadInfo()
+        return self.page.exists()
+    
+    def isRedirectPage(self):
+        self._loadInfo()
+        return self.page.isRedirectPage()
+    
+    def get(self, *args, **kwargs):
+        if not self.textLoaded:
+            self.backend.count("query")
+            self.infoLoaded = True
+            self.textLoaded = True
+        return self.page.get(*args, **kwargs)
+    
+    @property
+    def text(self):
+        if not self.textLoaded:
+            self.backend.count("query")
+            self.infoLoaded = True
+            self.textLoaded = True
+        return self.page.text
+    
+    @text.setter
+    def text(self, value):
+        self.page.text = value
+    
+    @property
+    def latest_revision_id(self):
+        self._loadInfo()
+        return self.page.latest_revision_id
+    
+    @property
+    def latest_file_info(self):
+        self.backend.count("query")
+        return self.page.latest_file_info
+    
+    def categories(self, *args, **kwargs):
+        return self.backend.countedList(self.page.categories(*args, **kwargs))
+    
+    def save(self, *args, **kwargs):
+        self.backend.count("edit")
+        self.page.save(*args, **kwargs)
+        self.infoLoaded = True
+        self.textLoaded = True
+    
+    def delete(self, *args, **kwargs):
+        self.backend.count("delete")
+        self.page.delete(*args, **kwargs)
+
+#A real wiki through pywikibot
+#Pages are handed out as DoxyMWPywikibotPages so edits, deletes and loads are counted like everything else
+class DoxyMWPywikibotBackend(DoxyMWBackend):
+    def __init__(self, site):
+        super().__init__()
+        self.site = site
+    
+    #Bots (apihighlimits) get ten times as many results per list request
+    @property
+    def listLimit(self):
+        return 5000 if self.site.has_right("apihighlimits") else 500
+    
+    def wrap(self, page, infoLoaded=False):
+        return DoxyMWPywikibotPage(self, page, infoLoaded)
+
+    def __str__(self):
+        return str(self.site)
+
+    def login(self):
+        self.count("login")
+        self.site.login()
+
+    def user(self):
+        return self.site.user()
+
+    def page(self, title):
+        return self.wrap(pywikibot.Page(self.site, title))
+
+    def filePage(self, title):
+        return self.wrap(pywikibot.FilePage(self.site, title))
+
+    def pages(self, titles):
+        for page in pagegenerators.PagesFromTitlesGenerator(titles, site=self.site):
+            yield self.wrap(page)
+
+    #Every category in the tree is listed with its own request
+    def subcategories(self, category):
+        self.count("list")
+        for page in pywikibot.Category(self.site, category).subcategories(recurse=True):
+            self.count("list")
+            yield self.wrap(page)
+
+    def categoryMembers(self, category):
+        #categorymembers comes with prop=info so redirect status is already loaded
+        for page in self.countedList(self.site.categorymembers(pywikibot.Category(self.site, category))):
+            yield self.wrap(page, infoLoaded=True)
+
+    def fileSha1s(self, category):
+        sha1s = {}
+        gen = api.PropertyGenerator("imageinfo", site=self.site, generator="categorymembers",
+            gcmtitle=category, gcmnamespace=6, gcmlimit="max", iiprop="sha1")
+        for pageData in self.countedList(gen):
+            if "imageinfo" in pageData and len(pageData["imageinfo"]) > 0:
+                sha1s[pageData["title"]] = pageData["imageinfo"][0]["sha1"]
+        return sha1s
+
+    def preload(self, pages, batchSize):
+        pages = list(pages)
+        self.count("query", (len(pages) + batchSize - 1) // batchSize)
+        for page in pagegenerators.PreloadingGenerator(iter([page.page for page in pages]), groupsize=batchSize):
+            pass #Pages are loaded in place
+        for page in pages:
+            page.infoLoaded = True
+            page.textLoaded = True
+
+    def upload(self, filePage, path, comment):
+        self.count("upload")
+        self.site.upload(filePage.page, source_filename=path, comment=comment, ignore_warnings=True)
+
+    def purge(self, titles, forceLinkUpdate=False):
+        self.count("purge")
+        return self.site.purgepages([pywikibot.Page(self.site, title) for title in titles], forcelinkupdate=forceLinkUpdate)
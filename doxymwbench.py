@@ -0,0 +1,265 @@
+#Benchmarks the phases of a DoxyMWBot update on a synthetic Doxygen HTML tree
+#so slowdowns (and speedups) in reading, converting, rendering and syncing show up as numbers
+#Nothing here touches a real wiki, the update phases run against an in-memory DoxyMWFakeWiki
+
+import os
+import sys
+import gc
+import json
+import time
+import random
+import hashlib
+import tracemalloc
+
+import doxymwglobal
+from doxymw import readDoxygenHTMLDocs
+from doxymwhashes import hashCache
+from doxymwremote import DoxyMWRemoteState
+from doxymwsite import DoxyMWSite
+from doxymwfakewiki import DoxyMWFakeWiki
+from doxymwpage import DoxyMWPage, DoxyMWTitle, DoxygenLinkIndex
+
+def getUsage():
+    return (
+        "\nUSAGE: python doxymwbench.py [<opts>]"
+        "\n"
+        "\n<opts> can be:"
+        "\n  -c:_, --classes:_     Number of classes in the synthetic docs (default 1000)"
+        "\n  -m:_, --members:_     Number of members per class (default 10)"
+        "\n  -l:_, --links:_       Number of links to other classes per class (default 8)"
+        "\n  -o:_, --output:_      Where to generate the synthetic docs (default ./tmp/bench)"
+        "\n  --latency:_           Seconds the fake wiki waits per request (default 0)"
+        "\n  --json:_              Also write the results to the file _ as JSON"
+        "\n  --no-memory           Don't trace memory (tracing slows everything down)"
+        "\n  -h,   --help          Prints help message")
+
+#Doxygen's file names, uppercase letters become "_" and the lowercase letter, "::" becomes "_1_1"
+def doxygenName(name):
+    return "".join("_" + c.lower() if c.isupper() else c for c in name).replace(".", "_1_1")
+
+def memberAnchor(className, member):
+    return "a" + hashlib.md5((className + "." + member).encode("utf-8")).hexdigest()
+
+#Generates a Doxygen HTML tree like one from a C# project at path + "/html"
+#Every class has a members list page and an inheritance diagram, namespaces hold 100 classes each
+#and there's a hierarchy page listing everything. Doesn't regenerate the tree if it's already there
+def generateDocs(path, classes, members, links):
+    htmlPath = path + "/html"
+    marker = htmlPath + "/bench.json"
+    params = {"classes" : classes, "members" : members, "links" : links}
+    if os.path.isfile(marker):
+        with open(marker) as fp:
+            if json.load(fp) == params:
+                return
+    if not os.path.isdir(htmlPath):
+        os.makedirs(htmlPath)
+
+    rand = random.Random(0) #Same docs every time
+    names = ["N" + str(i // 100) + ".Class" + str(i) for i in range(classes)]
+    files = ["class" + doxygenName(name) for name in names]
+    footer = ("<hr class=\"footer\"/><address class=\"footer\"><small>Generated on Mon Jan 4 2016 12:00:00 for Bench by &#160;"
+        "<a href=\"http://www.doxygen.org/index.html\"><img class=\"footer\" src=\"doxygen.png\" alt=\"doxygen\"/></a> 1.8.9.1</small></address>"
+        "</body></html>")
+
+    def header(title, nav, summary):
+        return ("<!DOCTYPE html><html><head><title>Bench: " + title + "</title></head><body>"
+            "<div id=\"top\"><div id=\"titlearea\">Bench</div>"
+            "<div id=\"nav-path\" class=\"navpath\"><ul>" + "".join("<li class=\"navelem\"><a class=\"el\" href=\"" + href + "\">" + text + "</a></li>" for href, text in nav) + "</ul></div></div>"
+            "<div class=\"header\"><div class=\"summary\">" + " &#124; ".join("<a href=\"" + href + "\">" + text + "</a>" for href, text in summary) + "</div>"
+            "<div class=\"headertitle\"><div class=\"title\">" + title + "</div></div></div>")
+
+    def write(name, text):
+        with open(htmlPath + "/" + name, "w") as fp:
+            fp.write(text)
+
+    with open(htmlPath + "/doxygen.png", "wb") as fp:
+        fp.write(b"\x89PNG\r\n\x1a\ndoxygen")
+
+    for i, name in enumerate(names):
+        namespace, className = name.split(".")
+        namespaceFile = "namespace" + doxygenName(namespace) + ".html"
+        memberNames = ["Method" + str(m) for m in range(members)]
+        nav = [(namespaceFile, namespace), (files[i] + ".html", className)]
+
+        #Links to the members of other classes
+        def link():
+            j = rand.randrange(classes)
+            member = "Method" + str(rand.randrange(members)) if members > 0 else None
+            if member:
+                return "<a class=\"el\" href=\"" + files[j] + ".html#" + memberAnchor(names[j], member) + "\">" + names[j] + "." + member + "</a>"
+            return "<a class=\"el\" href=\"" + files[j] + ".html\">" + names[j] + "</a>"
+
+        #Inheritance diagram, every class derives from class i // 2
+        base = i // 2
+        diagram = ("<div class=\"dynheader\">Inheritance diagram for " + name + ":</div>"
+            "<div class=\"dyncontent\"><div class=\"center\"><img src=\"" + files[i] + ".png\" usemap=\"#" + name + "_map\" alt=\"\"/>"
+            "<map id=\"" + name + "_map\" name=\"" + name + "_map\"><area href=\"" + files[base] + ".html\" alt=\"" + names[base] + "\" shape=\"rect\" coords=\"0,56,100,80\"/></map></div></div>")
+        with open(htmlPath + "/" + files[i] + ".png", "wb") as fp:
+            fp.write(b"\x89PNG\r\n\x1a\n" + name.encode("utf-8"))
+
+        decls = "".join(
+            "<tr class=\"memitem:" + memberAnchor(name, m) + "\"><td class=\"memItemLeft\" align=\"right\" valign=\"top\">void&#160;</td>"
+            "<td class=\"memItemRight\" valign=\"bottom\"><a class=\"el\" href=\"" + files[i] + ".html#" + memberAnchor(name, m) + "\">" + m + "</a> (int value)</td></tr>"
+            for m in memberNames)
+        docs = "".join(
+            "<a class=\"anchor\" id=\"" + memberAnchor(name, m) + "\"></a><div class=\"memitem\"><div class=\"memproto\"><table class=\"memname\"><tr>"
+            "<td class=\"memname\">void " + name + "." + m + " </td><td>(</td><td class=\"paramtype\">int&#160;</td><td class=\"paramname\"><em>value</em></td><td>)</td></tr></table></div>"
+            "<div class=\"memdoc\"><p>" + m + " does things, see " + link() + ".</p></div></div>"
+            for m in memberNames)
+
+        write(files[i] + ".html", header(name, nav, [("#pub-methods", "Public Member Functions"), (files[i] + "-members.html", "List of all members")]) +
+            "<div class=\"contents\">" + diagram +
+            "<table class=\"memberdecls\"><tr class=\"heading\"><td colspan=\"2\"><h2 class=\"groupheader\"><a name=\"pub-methods\"></a>Public Member Functions</h2></td></tr>" + decls + "</table>"
+            "<a name=\"details\" id=\"details\"></a><h2 class=\"groupheader\">Detailed Description</h2>"
+            "<div class=\"textblock\"><p>" + className + " is used with " + ", ".join(link() for l in range(links)) + ".</p></div>"
+            "<h2 class=\"groupheader\">Member Function Documentation</h2>" + docs +
+            "<hr/>The documentation for this class was generated from the following file:<ul><li>" + className + ".cs</li></ul></div>" + footer)
+
+        write(files[i] + "-members.html", header(name + " Member List", nav, []) +
+            "<div class=\"contents\"><p>This is the complete list of members for <a class=\"el\" href=\"" + files[i] + ".html\">" + name + "</a>, including all inherited members.</p>"
+            "<table class=\"directory\">" + "".join(
+            "<tr><td class=\"entry\"><a class=\"el\" href=\"" + files[i] + ".html#" + memberAnchor(name, m) + "\">" + m + "</a>(int value)</td><td class=\"entry\"><a class=\"el\" href=\"" + files[i] + ".html\">" + name + "</a></td></tr>"
+            for m in memberNames) + "</table></div>" + footer)
+
+    #Namespaces
+    for n in range(0, classes, 100):
+        namespace = names[n].split(".")[0]
+        namespaceFile = "namespace" + doxygenName(namespace)
+        write(namespaceFile + ".html", header(namespace, [(namespaceFile + ".html", namespace)], [("#nested-classes", "Classes")]) +
+            "<div class=\"contents\"><table class=\"memberdecls\"><tr class=\"heading\"><td colspan=\"2\"><h2 class=\"groupheader\"><a name=\"nested-classes\"></a>Classes</h2></td></tr>" + "".join(
+            "<tr class=\"memitem:\"><td class=\"memItemLeft\" align=\"right\" valign=\"top\">class &#160;</td><td class=\"memItemRight\" valign=\"bottom\"><a class=\"el\" href=\"" + files[i] + ".html\">" + names[i].split(".")[1] + "</a></td></tr>"
+            for i in range(n, min(n + 100, classes))) + "</table></div>" + footer)
+
+    #Class hierarchy
+    write("hierarchy.html", header("Class Hierarchy", [], []) +
+        "<div class=\"contents\"><div class=\"textblock\">This inheritance list is sorted roughly, but not completely, alphabetically:</div>"
+        "<div class=\"directory\"><table class=\"directory\">" + "".join(
+        "<tr><td class=\"entry\"><a class=\"el\" href=\"" + files[i] + ".html\" target=\"_self\">" + names[i] + "</a></td><td class=\"desc\"></td></tr>"
+        for i in range(classes)) + "</table></div></div>" + footer)
+
+    with open(marker, "w") as fp:
+        json.dump(params, fp)
+
+#Runs func as one phase and prints how long it took, how many items it got through and how much memory it needed at most
+#count is the number of items or a function that gets it from what func returned
+def runPhase(results, name, func, count):
+    gc.collect()
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        baseMemory = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    ret = func()
+    seconds = time.perf_counter() - start
+
+    items = count(ret) if callable(count) else count
+    result = {
+        "phase" : name,
+        "seconds" : seconds,
+        "items" : items,
+        "itemsPerSecond" : items / seconds if seconds > 0 else None,
+        "peakBytes" : tracemalloc.get_traced_memory()[1] - baseMemory if tracing else None
+    }
+    results.append(result)
+    print("{:<20} {:>10.3f}s {:>10} items {:>12} items/s {:>12} peak".format(name, seconds, items,
+        "{:.1f}".format(result["itemsPerSecond"]) if result["itemsPerSecond"] else "-",
+        "{:.1f}MB".format(result["peakBytes"] / (1 << 20)) if tracing else "-"))
+    return ret
+
+def main():
+    classes = 1000
+    members = 10
+    links = 8
+    output = "./tmp/bench"
+    latency = 0
+    jsonPath = None
+    memory = True
+
+    for arg in sys.argv[1:]:
+        try:
+            if arg.find("-c:") == 0 or arg.find("--classes:") == 0:
+                classes = int(arg.split(":", 1)[1])
+            elif arg.find("-m:") == 0 or arg.find("--members:") == 0:
+                members = int(arg.split(":", 1)[1])
+            elif arg.find("-l:") == 0 or arg.find("--links:") == 0:
+                links = int(arg.split(":", 1)[1])
+            elif arg.find("-o:") == 0 or arg.find("--output:") == 0:
+                output = arg.split(":", 1)[1]
+            elif arg.find("--latency:") == 0:
+                latency = float(arg.split(":", 1)[1])
+            elif arg.find("--json:") == 0:
+                jsonPath = arg.split(":", 1)[1]
+            elif arg == "--no-memory":
+                memory = False
+            elif arg == "-h" or arg == "--help":
+                print(getUsage())
+                sys.exit(0)
+            else:
+                raise ValueError(arg)
+        except ValueError:
+            print("Invalid option " + arg)
+            print(getUsage())
+            sys.exit(1)
+
+    #Keep everything the run writes out of the real tmp path
+    doxymwglobal.config["doxygen_tmpPath"] = output
+    doxymwglobal.config["mediaWiki_manifestPath"] = output + "/manifest.sqlite"
+    doxymwglobal.config["doxygen_listingCachePath"] = output + "/listing.json"
+    hashCache.path = output + "/filehashes.json"
+    if os.path.isfile(doxymwglobal.config["mediaWiki_manifestPath"]):
+        os.remove(doxymwglobal.config["mediaWiki_manifestPath"])
+
+    start = time.perf_counter()
+    generateDocs(output, classes, members, links)
+    print("Synthetic docs for " + str(classes) + " classes ready in {:.3f}s".format(time.perf_counter() - start))
+
+    if memory:
+        tracemalloc.start()
+    results = []
+
+    #Reading and converting, like doxymw.py main but with everything in memory so each phase is separate
+    pages = runPhase(results, "read", readDoxygenHTMLDocs, len)
+
+    linkIndex = DoxygenLinkIndex()
+    def index():
+        for page in pages:
+            linkIndex.add(page.filename, DoxyMWTitle(page.data["title"], avoid=False).title, page.anchors)
+    runPhase(results, "index", index, len(pages))
+
+    def convert():
+        for page in pages:
+            page.convert(linkIndex)
+    runPhase(results, "convert", convert, len(pages))
+
+    #Planning and rendering everything that goes on the wiki
+    wiki = DoxyMWFakeWiki(":memory:", latency)
+    site = DoxyMWSite(wiki)
+    otherPages = [page for page in pages if page.type == "OTHER"]
+    onePages = []
+    planned = runPhase(results, "plan", lambda: list(site.allPages(pages, otherPages, onePages)), len)
+    runPhase(results, "render", lambda: [page.mwhash for page in planned], len(planned))
+
+    #Syncing with the wiki, once when it's empty and once more when nothing changed
+    def update():
+        requests = wiki.requests.copy()
+        manifest = site.openManifest()
+        DoxyMWPage.remote = DoxyMWRemoteState(wiki)
+        updatedPages, changedPages = site.updatePages(planned, manifest)
+        site.findStalePages(updatedPages)
+        DoxyMWPage.remote = None
+        manifest.close()
+        return wiki.requests - requests
+    for name in ("update", "update (unchanged)"):
+        requests = runPhase(results, name, update, len(planned))
+        results[-1]["requests"] = dict(requests)
+        print("  requests: " + ", ".join(request + "=" + str(n) for request, n in sorted(requests.items())))
+
+    if memory:
+        tracemalloc.stop()
+    if jsonPath:
+        with open(jsonPath, "w") as fp:
+            json.dump({"classes" : classes, "members" : members, "links" : links, "latency" : latency, "results" : results}, fp, indent=2)
+
+if __name__ == '__main__':
+    main()
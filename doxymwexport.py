@@ -0,0 +1,104 @@
+import re
+import os
+import time
+import shutil
+from xml.sax.saxutils import escape
+
+import doxymwglobal
+from doxymwmetrics import metrics
+from doxymwsite import DoxyMWSite
+from doxymwpage import ImagePage, StylesPage, TransclusionPage
+
+#Writes pages to a MediaWiki XML export instead of the wiki, to be put on it all at once by the server's
+#maintenance/importDump.php (and the images by maintenance/importImages.php) which is much faster for a
+#first upload or a full rebuild than saving every page through the API
+#Everything in path is replaced
+# + pages.xml - The XML export of every page
+# + images/ - Every image under its title on the wiki with its description page next to it as <file>.txt
+#       for php importImages.php --comment-ext=txt <path>/images
+# + images.txt - Manifest of the images, one line each with title, sha1 and the file it came from (tab separated)
+#Pages are written as soon as they're given so nothing has to be held on to
+#MediaWiki:Common.css and the transclusion pages are left out unless export_sharedPages is set, importing would overwrite what
+#users put on them, update only changes the parts that are ours
+class DoxyMWExport(object):
+    #Characters that can't be in XML at all
+    invalidChars = re.compile("[^\t\n\r\u0020-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFF]")
+
+    def __init__(self, path):
+        self.path = path
+        self.imagesPath = path + "/images"
+        if os.path.isdir(self.imagesPath):
+            shutil.rmtree(self.imagesPath)
+        os.makedirs(self.imagesPath)
+
+        #Every page gets the same revision
+        self.timestamp = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        self.user = escape(doxymwglobal.config["export_userName"])
+        self.comment = escape(doxymwglobal.config["export_comment"])
+
+        self.fp = open(path + "/pages.xml", "w", encoding="utf-8")
+        self.imagesFp = open(path + "/images.txt", "w", encoding="utf-8")
+        self.fp.write('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" '
+            'xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:schemaLocation="http://www.mediawiki.org/xml/export-0.10/ http://www.mediawiki.org/xml/export-0.10.xsd" '
+            'version="0.10" xml:lang="en">\n')
+
+    #Writes a page, images go to the images directory instead
+    def write(self, pageData):
+        if isinstance(pageData, ImagePage):
+            self.writeImage(pageData)
+            return
+
+        text = DoxyMWExport.invalidChars.sub("", pageData.strategy.exportText(pageData))
+        size = len(text.encode("utf-8"))
+        self.fp.write("  <page>\n"
+            "    <title>" + escape(pageData.mwtitle) + "</title>\n"
+            "    <revision>\n"
+            "      <timestamp>" + self.timestamp + "</timestamp>\n"
+            "      <contributor><username>" + self.user + "</username></contributor>\n"
+            "      <comment>" + self.comment + "</comment>\n"
+            "      <model>" + ("css" if pageData.mwtitle.endswith(".css") else "wikitext") + "</model>\n"
+            "      <format>" + ("text/css" if pageData.mwtitle.endswith(".css") else "text/x-wiki") + "</format>\n"
+            '      <text xml:space="preserve" bytes="' + str(size) + '">' + escape(text) + "</text>\n"
+            "    </revision>\n"
+            "  </page>\n")
+        metrics.count("export", "pages")
+        metrics.count("export", "bytes", size)
+
+    def writeImage(self, pageData):
+        source = pageData.filepath + "/" + pageData.filename
+        target = self.imagesPath + "/" + pageData.normtitle.title
+        shutil.copyfile(source, target)
+        with open(target + ".txt", "w", encoding="utf-8") as fp:
+            fp.write(pageData.mwcontents)
+        self.imagesFp.write(pageData.mwtitle + "\t" + pageData.sha1 + "\t" + os.path.abspath(source) + "\n")
+        metrics.count("export", "images")
+        metrics.count("export", "bytes", os.path.getsize(source))
+
+    #finished=False leaves pages.xml without its end so an export that failed partway can't be imported
+    def close(self, finished=True):
+        if finished:
+            self.fp.write("</mediawiki>\n")
+        self.fp.close()
+        self.imagesFp.close()
+
+#EXPORT - Writes all the pages update would put on the wiki to an export in export_path
+#wikiPages and otherPages are the same as for DoxyMWSite.update, wikiPages is only gone through once
+#There's no wiki to ask for the bot user, so there's no user page
+def exportPages(wikiPages, otherPages):
+    path = doxymwglobal.config["export_path"]
+    sharedPages = doxymwglobal.config["export_sharedPages"]
+    export = DoxyMWExport(path)
+    finished = False
+    try:
+        with metrics.phase("export"):
+            for pageData in DoxyMWSite.allPages(wikiPages, list(otherPages), [StylesPage()] if sharedPages else []):
+                if not sharedPages and isinstance(pageData, TransclusionPage):
+                    metrics.count("export", "skipped")
+                    continue
+                export.write(pageData)
+                pageData.release()
+        finished = True
+    finally:
+        export.close(finished)
+    doxymwglobal.msg(doxymwglobal.msgType.info, "Exported to " + path)
@@ -0,0 +1,235 @@
+import re
+import os
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+import collections
+
+import pywikibot
+
+from doxymwbackend import DoxyMWBackend
+
+#A stand-in for a real wiki that lives in this process, for benchmarking and testing update and cleanup offline
+#Pages are kept in SQLite, either in memory (":memory:") or in a file so the wiki lasts between runs
+#Categories and redirects come from the page text the same way MediaWiki does it
+#Every request a real wiki would get is counted in requests and can be slowed down by latency seconds
+class DoxyMWFakeWiki(DoxyMWBackend):
+    categoryLink = re.compile("\\[\\[\\s*Category\\s*:\\s*([^\\]|]+?)\\s*(\\||\\]\\])", re.I)
+    redirect = re.compile("\\s*#REDIRECT", re.I)
+
+    def __init__(self, path=":memory:", latency=0, user="DoxyMWBot"):
+        super().__init__()
+        if path != ":memory:":
+            dirPath = os.path.dirname(path)
+            if dirPath and not os.path.isdir(dirPath):
+                os.makedirs(dirPath)
+
+        self.path = path
+        self.latency = latency
+        self.userName = user
+        #A wiki in memory is a new wiki every run, so nothing (like the manifest) should think it's seen it before
+        self.key = path if path != ":memory:" else ":memory:" + uuid.uuid4().hex
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (title TEXT PRIMARY KEY, text TEXT, revid INTEGER, redirect INTEGER, sha1 TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS categorylinks (title TEXT, category TEXT)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS categorylinksCategory ON categorylinks (category)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS categorylinksTitle ON categorylinks (title)")
+        self.lastRevid = self.db.execute("SELECT MAX(revid) FROM pages").fetchone()[0] or 0
+
+    def __str__(self):
+        return "fakewiki:" + self.key
+
+    def count(self, request, n=1):
+        super().count(request, n)
+        if self.latency:
+            time.sleep(self.latency * n)
+
+    #Rows of the page table for the titles, keyed by title
+    def fetch(self, titles):
+        rows = {}
+        with self.lock:
+            for title in titles:
+                row = self.db.execute("SELECT title, text, revid, redirect, sha1 FROM pages WHERE title = ?", (title,)).fetchone()
+                if row:
+                    rows[title] = row
+        return rows
+
+    #Saves text to title as a new revision, returns the new revid
+    def write(self, title, text, sha1=None):
+        categories = set("Category:" + match.group(1) for match in DoxyMWFakeWiki.categoryLink.finditer(text))
+        isRedirect = 1 if DoxyMWFakeWiki.redirect.match(text) else 0
+        with self.lock:
+            self.lastRevid += 1
+            if sha1 == None:
+                row = self.db.execute("SELECT sha1 FROM pages WHERE title = ?", (title,)).fetchone()
+                sha1 = row[0] if row else None
+            self.db.execute("INSERT OR REPLACE INTO pages (title, text, revid, redirect, sha1) VALUES (?, ?, ?, ?, ?)",
+                (title, text, self.lastRevid, isRedirect, sha1))
+            self.db.execute("DELETE FROM categorylinks WHERE title = ?", (title,))
+            self.db.executemany("INSERT INTO categorylinks (title, category) VALUES (?, ?)", [(title, cat) for cat in categories])
+            self.db.commit()
+            return self.lastRevid
+
+    def remove(self, title):
+        with self.lock:
+            self.db.execute("DELETE FROM pages WHERE title = ?", (title,))
+            self.db.execute("DELETE FROM categorylinks WHERE title = ?", (title,))
+            self.db.commit()
+
+    #Titles of the pages in category, optionally only the ones that are categories themselves
+    def memberTitles(self, category, categoriesOnly=False):
+        with self.lock:
+            rows = self.db.execute("SELECT title FROM categorylinks WHERE category = ? ORDER BY title", (category,)).fetchall()
+        titles = [row[0] for row in rows]
+        if categoriesOnly:
+            titles = [title for title in titles if title.startswith("Category:")]
+        self.count("list", max(1, (len(titles) + DoxyMWFakeWiki.listLimit - 1) // DoxyMWFakeWiki.listLimit))
+        return titles
+
+    #Titles of the categories title is in
+    def categoryTitles(self, title):
+        with self.lock:
+            rows = self.db.execute("SELECT category FROM categorylinks WHERE title = ? ORDER BY category", (title,)).fetchall()
+        return [row[0] for row in rows]
+
+    #Pages made with the rows already loaded
+    def loadedPages(self, titles):
+        rows = self.fetch(titles)
+        for title in titles:
+            page = DoxyMWFakePage(self, title)
+            page.setRow(rows.get(title))
+            yield page
+
+    def login(self):
+        self.count("login")
+
+    def user(self):
+        return self.userName
+
+    def page(self, title):
+        return DoxyMWFakePage(self, title)
+
+    def filePage(self, title):
+        return DoxyMWFakePage(self, "File:" + title)
+
+    def pages(self, titles):
+        for title in titles:
+            yield DoxyMWFakePage(self, title)
+
+    def subcategories(self, category):
+        done = set()
+        pending = collections.deque([category])
+        while len(pending) > 0:
+            for title in self.memberTitles(pending.popleft(), categoriesOnly=True):
+                if title in done:
+                    continue
+                done.add(title)
+                pending.append(title)
+                yield DoxyMWFakePage(self, title)
+
+    def categoryMembers(self, category):
+        return self.loadedPages(self.memberTitles(category))
+
+    def fileSha1s(self, category):
+        titles = [title for title in self.memberTitles(category) if title.startswith("File:")]
+        return dict((title, row[4]) for title, row in self.fetch(titles).items() if row[4])
+
+    def preload(self, pages, batchSize):
+        pages = list(pages)
+        self.count("query", (len(pages) + batchSize - 1) // batchSize)
+        rows = self.fetch([page.title() for page in pages])
+        for page in pages:
+            page.setRow(rows.get(page.title()))
+
+    def upload(self, filePage, path, comment):
+        self.count("upload")
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 16), b""):
+                sha1.update(chunk)
+
+        #Like MediaWiki, the comment only becomes the description of files that are new
+        title = filePage.title()
+        row = self.fetch([title]).get(title)
+        text = row[1] if row else comment
+        filePage.setRow((title, text, self.write(title, text, sha1.hexdigest()), 0, sha1.hexdigest()))
+
+    def purge(self, titles, forceLinkUpdate=False):
+        self.count("purge")
+        return True
+
+#The parts of pywikibot.Page the strategies use, for pages on a DoxyMWFakeWiki
+class DoxyMWFakePage(object):
+    FileInfo = collections.namedtuple("FileInfo", ["sha1"])
+
+    def __init__(self, wiki, title):
+        self.site = wiki
+        self._title = title
+        self._row = None
+        self._loaded = False
+        self._text = None #Text set to be saved
+
+    #Sets what's on the wiki for the page, None if it doesn't exist
+    def setRow(self, row):
+        self._row = row
+        self._loaded = True
+
+    def load(self):
+        if not self._loaded:
+            self.site.count("query")
+            self.setRow(self.site.fetch([self._title]).get(self._title))
+
+    def title(self):
+        return self._title
+
+    def exists(self):
+        self.load()
+        return self._row != None
+
+    def isRedirectPage(self):
+        return self.exists() and self._row[3] == 1
+
+    def get(self):
+        if not self.exists():
+            raise pywikibot.exceptions.NoPage(self)
+        return self._row[1]
+
+    @property
+    def text(self):
+        if self._text != None:
+            return self._text
+        return self.get() if self.exists() else ""
+
+    @text.setter
+    def text(self, value):
+        self._text = value
+
+    @property
+    def latest_revision_id(self):
+        return self._row[2] if self.exists() else None
+
+    @property
+    def latest_file_info(self):
+        self.site.count("query")
+        if not self.exists() or not self._row[4]:
+            raise pywikibot.exceptions.NoPage(self)
+        return DoxyMWFakePage.FileInfo(self._row[4])
+
+    def categories(self):
+        self.site.count("list")
+        return [DoxyMWFakePage(self.site, title) for title in self.site.categoryTitles(self._title)]
+
+    def save(self, *args, **kwargs):
+        self.site.count("edit")
+        text = self.text
+        self.setRow((self._title, text, self.site.write(self._title, text), 1 if DoxyMWFakeWiki.redirect.match(text) else 0,
+            self._row[4] if self._row else None))
+        self._text = None
+
+    def delete(self, reason="", prompt=False, **kwargs):
+        self.site.count("delete")
+        self.site.remove(self._title)
+        self.setRow(None)
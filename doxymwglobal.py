@@ -1,4 +1,7 @@
+import os
 import sys
+import errno
+import collections
 from enum import Enum
 
 #Configuration options
@@ -10,6 +13,33 @@ config = {}
 config["doxygen_binaryPath"] = "C:/Program Files/doxygen/bin"
 config["doxygen_configPath"] = "./DoxyfileTest" 
 config["doxygen_tmpPath"] = "./tmp" 
+#Seconds doxygen gets to run, plus doxygen_timeoutPerFile for every input file. None to wait forever
+config["doxygen_timeout"] = 60
+config["doxygen_timeoutPerFile"] = 0.5
+config["doxygen_convertAhead"] = 64 #How many converted pages can be waiting to be uploaded at once
+config["doxygen_scanBytes"] = 65536 #How far (in characters) into a Doxygen HTML file to look for its title before parsing all of it instead
+config["doxygen_hashCachePath"] = config["doxygen_tmpPath"] + "/filehashes.json" #sha1s of images kept between runs
+config["doxygen_listingCachePath"] = config["doxygen_tmpPath"] + "/listing.json" #Doxygen HTML docs found last time, None to always look
+
+#Which Doxygen HTML files become pages, by their name without .html
+#Doxygen generates all it's files with prefixes by type
+#This is not an exhaustive list, some configuration patterns have not been tested
+#Each is a regex to the type of page, the first that matches (in order) is used
+config["doxygen_filePrefixes"] = collections.OrderedDict([
+    ("-members$", "MEMBERS"), #Match members lists first
+    ("^_", "FILE"),
+    ("^namespace_", "NAMESPACE"),
+    ("^class_", "CLASS"),
+    ("^interface_", "INTERFACE")
+])
+#Other files we want (useful and don't provide redundancies to MediaWiki functionality), these are type OTHER
+#Class hierarchy, hierarchy.html
+config["doxygen_otherFiles"] = [
+    "hierarchy"
+]
+#Which of doxygen's outputs the pages are read from
+#"html" scrapes the HTML output, "xml" streams the XML output (no images or member list pages)
+config["doxygen_reader"] = "html"
 
 #MediaWiki stuff
 #Primary user interaction category, non-hidden, all documents with subgroups
@@ -44,6 +74,53 @@ config["mediaWiki_setupTransclusions"] = True
 config["mediaWiki_transclusionCategory"] = "DoxyMWBot TransclusionDocs" #Hidden category name
 config["mediaWiki_transclusionPrefix"] = "" #Prefix of transclusion, can be empty or not defined
 
+#Which wiki pages go to
+#"pywikibot" is the real wiki from your pywikibot config, "fake" is an offline stand-in (see doxymwfakewiki.py) for benchmarking
+#The fake wiki is kept in mediaWiki_fakeWikiPath (":memory:" to start empty every run) and waits mediaWiki_fakeWikiLatency seconds per request
+config["mediaWiki_backend"] = "pywikibot"
+config["mediaWiki_fakeWikiPath"] = ":memory:"
+config["mediaWiki_fakeWikiLatency"] = 0
+
+#Local manifest of every page the bot has put on the wiki
+#Pages whose contents match the manifest are skipped during update without touching the wiki at all
+config["mediaWiki_manifestPath"] = config["doxygen_tmpPath"] + "/manifest.sqlite"
+config["mediaWiki_manifestMaxAge"] = 7*24*60*60 #Seconds until a manifest entry is stale and checked on the wiki again, 0 to never go stale
+#Journal of everything the current update has done on the wiki, --resume carries on from it (see doxymwjournal.py)
+config["mediaWiki_journalPath"] = config["doxygen_tmpPath"] + "/journal.jsonl"
+
+#Number of pages whose current state is fetched from the wiki per request during update
+#50 works for everyone, bots with the apihighlimits right can use up to 500
+config["mediaWiki_preloadBatchSize"] = 50
+
+#Number of threads saving pages at once
+#pywikibot's put_throttle (user-config.py) still spaces out the saves, lower it to get any benefit from more threads
+config["mediaWiki_workerThreads"] = 4
+#When the wiki asks us to slow down (maxlag, rate limits, server errors) all threads wait mediaWiki_retryDelay seconds
+#and try again, doubling the wait each time, up to mediaWiki_retries times
+config["mediaWiki_retryDelay"] = 5
+config["mediaWiki_retries"] = 5
+
+#Bot users the shards of a sharded update (--shards) log in as, shard i uses user i modulo the number of users
+#Every user needs to be set up in your pywikibot config (or be logged in already), empty to use the default user for every shard
+config["mediaWiki_shardUsers"] = []
+
+#Pages that changed are purged at the end of update, this many per request
+config["mediaWiki_purgeBatchSize"] = 50
+config["mediaWiki_purgeForceLinkUpdate"] = False #Also update the link tables of purged pages
+
+#Where the export command writes the XML export and images (see doxymwexport.py), its contents are replaced every export
+#Put on the wiki with php maintenance/importDump.php <path>/pages.xml and php maintenance/importImages.php --comment-ext=txt <path>/images
+config["export_path"] = config["doxygen_tmpPath"] + "/export"
+config["export_userName"] = "DoxyMWBot" #Who the exported revisions are by
+config["export_comment"] = "Autogenerated Doxygen docs" #Edit summary of the exported revisions
+#Also export MediaWiki:Common.css and the transclusion pages, which are shared with the wiki's users
+#Importing them replaces them whole (the site's own CSS and any edits to the transclusion pages included) so only turn it on for a new wiki
+#Left off, update puts them on the wiki afterwards without touching what users added
+config["export_sharedPages"] = False
+
+#JSON report of how long every phase of the last run took and what it did (see doxymwmetrics.py), None to not write one
+config["metrics_path"] = config["doxygen_tmpPath"] + "/metrics.json"
+
 #Program default options
 #Change at run time
 option = {}
@@ -51,6 +128,10 @@ option["command"] = None
 option["interactive"] = False
 option["debug"] = []
 option["warnIsError"] = False
+option["force"] = False
+option["resume"] = False
+option["jobs"] = 1
+option["shards"] = 1
 class msgType(Enum):
     error = 3
     warning = 2
@@ -59,7 +140,15 @@ class msgType(Enum):
 option["printLevel"] = msgType.warning
 
 #Utility functions    
+#str can also be a function returning the message so it's only built if it's going to be printed
 def msg(type, str, usage=False, **kwargs):
+    #Nothing to do for messages below the printLevel (errors and warnings that are errors always stop the program)
+    if (type.value < option["printLevel"].value and not usage and
+        type != msgType.error and not (type == msgType.warning and option["warnIsError"])):
+        return
+    if callable(str):
+        str = str()
+    
     #Determine all variables
     printStr = None
     isError = False
@@ -95,19 +184,24 @@ def getUsage():
         "\n<command> can be:"
         "\n  update   update some wiki with documentation"
         "\n  cleanup  delete all the autogenerated documentation on a wiki"
+        "\n  export   write the documentation to a MediaWiki XML export (and images) for importDump.php"
         "\n"
         "\n<opts> can be:"
         "\n  -i,   --interactive   Interactive mode"
         "\n  -d:_, --debug:_       Debug where _ is in [doxygen, unsafeUpdate, whichDelete]"
         "\n  -p:_, --printLevel:_  Show msgs with severity _ in [error, warning, info, or debug]"
         "\n  -w,   --warnIsError   If warnings cause program to stop"
+        "\n  -f,   --force         Ignore the local manifest and check every page on the wiki, always run doxygen"
+        "\n  -r,   --resume        Pick up the last update where it stopped if it didn't finish"
+        "\n  -j:_, --jobs:_        Read and convert the Doxygen docs with _ processes"
+        "\n  -s:_, --shards:_      Split saving pages between _ logins (see mediaWiki_shardUsers)"
         "\n  -h,   --help          Prints help message")
         
 def printHelp():
     print(getUsage())
 
 def debugPath():
-    debugPath = doxymwglobal.config["doxygen_tmpPath"] + "/debug"
+    debugPath = config["doxygen_tmpPath"] + "/debug"
     try:
         os.makedirs(debugPath)
     except OSError as e:
@@ -0,0 +1,61 @@
+import os
+import json
+import hashlib
+import threading
+
+import doxymwglobal
+
+#sha1s of local files, kept across runs
+#A file is only read and hashed again if its modification time or size changed
+class DoxyMWHashCache(object):
+    def __init__(self, path):
+        self.path = path
+        self.hashes = None #{file path : [mtime, size, sha1]}, loaded on first use
+        self.dirty = False
+        self.lock = threading.Lock() #Files are hashed from the conversion thread and the worker threads
+
+    def load(self):
+        self.hashes = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "rt") as fp:
+                    self.hashes = json.load(fp)
+            except ValueError:
+                doxymwglobal.msg(doxymwglobal.msgType.info, "Hash cache " + self.path + " is corrupt, starting a new one")
+
+    #Returns the hex sha1 of the file at path
+    def sha1(self, path):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            if self.hashes == None:
+                self.load()
+            entry = self.hashes.get(path)
+            if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+                return entry[2]
+
+        sha1 = hashlib.sha1()
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(1 << 16), b""):
+                sha1.update(chunk)
+        digest = sha1.hexdigest()
+
+        with self.lock:
+            self.hashes[path] = [stat.st_mtime, stat.st_size, digest]
+            self.dirty = True
+        return digest
+
+    #Writes the cache out if anything changed
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            dirPath = os.path.dirname(self.path)
+            if dirPath and not os.path.isdir(dirPath):
+                os.makedirs(dirPath)
+            with open(self.path, "wt") as fp:
+                json.dump(self.hashes, fp)
+            self.dirty = False
+
+#The cache every file hash goes through
+hashCache = DoxyMWHashCache(doxymwglobal.config["doxygen_hashCachePath"])
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+import doxymwglobal
+
+#Append only record of what an update has finished on the wiki, so an update that died partway through
+#(network gone, Ctrl-C, ...) can be picked up again with --resume instead of starting over
+#Every line is a JSON object with
+# + run - Id of the update the line belongs to
+# + op - begin, save, check, delete, purge or end
+# + title - MediaWiki title of the page (begin has the site instead, end has nothing)
+# + hash - sha1 of the contents that were saved or checked, None for the rest
+#save is a page that was changed on the wiki, check one the wiki already had
+#Lines are flushed as they're written so everything up to a crash is kept, a half written last line is ignored
+class DoxyMWJournal(object):
+    def __init__(self, path, siteKey, resume=False):
+        dirPath = os.path.dirname(path)
+        if dirPath and not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+
+        self.path = path
+        self.lock = threading.Lock() #Written from the worker and shard threads
+        self.done = {} #(op, title) of everything the run being resumed finished, to the hash it was done with
+        self.run = None
+
+        #Only an unfinished run for the same site and bot user can be resumed
+        if resume:
+            run, runSite, done, ended = self._load()
+            if run == None or ended:
+                doxymwglobal.msg(doxymwglobal.msgType.info, "Nothing to resume in " + path + ", starting a new update")
+            elif runSite != siteKey:
+                doxymwglobal.msg(doxymwglobal.msgType.info, "Update in " + path + " was for " + runSite + ", starting a new one")
+            else:
+                self.run = run
+                self.done = done
+                doxymwglobal.msg(doxymwglobal.msgType.info, "Resuming update " + run + ", " + str(len(done)) + " operations already done")
+
+        if self.run:
+            self.fp = open(path, "a", encoding="utf-8")
+        else:
+            #Nothing before a new run is needed anymore
+            self.run = time.strftime("%Y%m%d%H%M%S") + "-" + uuid.uuid4().hex[:8]
+            self.fp = open(path, "w", encoding="utf-8")
+            self._write("begin", siteKey)
+
+    #The last run in the journal as (run id, site, done, whether it ended)
+    def _load(self):
+        run = None
+        runSite = None
+        done = {}
+        ended = False
+        if not os.path.isfile(self.path):
+            return (run, runSite, done, ended)
+
+        with open(self.path, encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry["op"] == "begin":
+                    run = entry["run"]
+                    runSite = entry["title"]
+                    done = {}
+                    ended = False
+                elif entry["run"] != run:
+                    continue
+                elif entry["op"] == "end":
+                    ended = True
+                else:
+                    done[(entry["op"], entry["title"])] = entry["hash"]
+        return (run, runSite, done, ended)
+
+    def _write(self, op, title=None, hash=None):
+        line = json.dumps({"run" : self.run, "op" : op, "title" : title, "hash" : hash}) + "\n"
+        with self.lock:
+            self.fp.write(line)
+            self.fp.flush()
+
+    #Whether the run being resumed already did op to title (with contents hash for save and check)
+    def isDone(self, op, title, hash=None):
+        key = (op, title)
+        return key in self.done and self.done[key] == hash
+
+    #Titles the run being resumed already did op to
+    def doneTitles(self, op):
+        return [title for doneOp, title in self.done if doneOp == op]
+
+    #Records that op was done to title
+    def record(self, op, title, hash=None):
+        self._write(op, title, hash)
+
+    #Records that the whole update finished, there's nothing left to resume
+    def end(self):
+        self._write("end")
+
+    def close(self):
+        with self.lock:
+            self.fp.close()
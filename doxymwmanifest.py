@@ -0,0 +1,76 @@
+import os
+import time
+import sqlite3
+
+import doxymwglobal
+
+#Local record of every page the bot owns on the wiki
+#Lets update skip pages whose contents haven't changed since the last run without asking the wiki anything
+#Every entry is keyed by the MediaWiki title of the page and holds
+# + hash - sha1 of the contents we last put on (or found on) the wiki
+# + revid - Revision id of the page after we last touched it, None if unknown (e.g. files)
+# + strategy - Name of the strategy used to put the page
+# + checked - Time the entry was last confirmed against the wiki
+class DoxyMWManifest(object):
+    #How many records we write before committing to disk
+    commitEvery = 200
+
+    def __init__(self, path, siteKey):
+        dirPath = os.path.dirname(path)
+        if dirPath and not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS pages (title TEXT PRIMARY KEY, hash TEXT, revid INTEGER, strategy TEXT, checked REAL)")
+        self.uncommitted = 0
+
+        #A manifest made for another wiki (or another bot user) says nothing about this one
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'site'").fetchone()
+        if not row or row[0] != siteKey:
+            if row:
+                doxymwglobal.msg(doxymwglobal.msgType.info, "Manifest " + path + " was made for " + row[0] + ", starting a new one")
+            self.clear()
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('site', ?)", (siteKey,))
+            self.db.commit()
+
+    #Whether the wiki is known to already hold contents with the given hash for title
+    #Entries older than mediaWiki_manifestMaxAge are stale and have to be checked against the wiki again
+    def isCurrent(self, title, hash):
+        row = self.db.execute("SELECT hash, checked FROM pages WHERE title = ?", (title,)).fetchone()
+        if not row or row[0] != hash:
+            return False
+
+        maxAge = doxymwglobal.config["mediaWiki_manifestMaxAge"]
+        if maxAge and time.time() - row[1] > maxAge:
+            return False
+
+        return True
+
+    #Records that the wiki holds contents with the given hash for title
+    def record(self, title, hash, revid=None, strategy=None):
+        self.db.execute("INSERT OR REPLACE INTO pages (title, hash, revid, strategy, checked) VALUES (?, ?, ?, ?, ?)",
+            (title, hash, revid, strategy, time.time()))
+        self._wrote()
+
+    #Drops an entry so the page will be checked against the wiki next time
+    def forget(self, title):
+        self.db.execute("DELETE FROM pages WHERE title = ?", (title,))
+        self._wrote()
+
+    #Drops all entries
+    def clear(self):
+        self.db.execute("DELETE FROM pages")
+        self.db.commit()
+        self.uncommitted = 0
+
+    def _wrote(self):
+        self.uncommitted += 1
+        if self.uncommitted >= DoxyMWManifest.commitEvery:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
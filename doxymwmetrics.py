@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import threading
+import contextlib
+import collections
+
+import doxymwglobal
+from doxymwbackend import DoxyMWBackend
+
+#Wall time and counts for every phase of a run (doxygen, discovery, indexing, conversion, upload, deletion, purge)
+#written out as JSON at the end so runs can be compared over time
+#Phases that run alongside each other (conversion happens while pages are uploaded) each report the time spent in them
+#Indexing is the first pass that reads titles and anchors for the link index, extracting and converting pages are both in conversion
+#Every phase has
+# + seconds - Wall time spent in the phase
+# + requests - Requests the backends sent during the phase, by kind (every kind in DoxyMWBackend.requestKinds is always there)
+# + anything counted with count (pages, saved, skipped, bytes, ...)
+class DoxyMWMetrics(object):
+    def __init__(self):
+        self.phases = collections.OrderedDict()
+        self.lock = threading.Lock() #Counted from the worker threads
+        self.backends = [] #The DoxyMWBackends whose requests are counted for phases
+        self.started = time.time()
+
+    def _phase(self, name):
+        if name not in self.phases:
+            self.phases[name] = {"seconds" : 0.0, "requests" : collections.Counter()}
+        return self.phases[name]
+
+    #Adds seconds of wall time to phase name
+    def addTime(self, name, seconds):
+        with self.lock:
+            self._phase(name)["seconds"] += seconds
+
+    #Adds n to the count of key in phase name
+    def count(self, name, key, n=1):
+        with self.lock:
+            phase = self._phase(name)
+            phase[key] = phase.get(key, 0) + n
+
+    #All the requests sent so far by all the backends
+    def requests(self):
+        requests = collections.Counter()
+        for backend in self.backends:
+            requests.update(backend.requests)
+        return requests
+    
+    #Times everything in the with block as phase name, along with the requests sent during it
+    @contextlib.contextmanager
+    def phase(self, name):
+        requests = self.requests()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.addTime(name, time.perf_counter() - start)
+            requests = self.requests() - requests
+            with self.lock:
+                self._phase(name)["requests"].update(requests)
+
+    #Yields everything in iterable, timing only how long it took to produce them as phase name and counting them as pages
+    #For phases done lazily as something else uses them up (like conversion during upload)
+    def timed(self, name, iterable):
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.addTime(name, time.perf_counter() - start)
+            self.count(name, "pages")
+            yield item
+
+    #Everything measured so far as a dict that can go straight to JSON
+    def report(self):
+        with self.lock:
+            phases = collections.OrderedDict()
+            for name, phase in self.phases.items():
+                phases[name] = dict(phase)
+                phases[name]["requests"] = dict((kind, 0) for kind in DoxyMWBackend.requestKinds)
+                phases[name]["requests"].update(phase["requests"])
+        return {
+            "command" : doxymwglobal.option["command"],
+            "started" : self.started,
+            "seconds" : time.time() - self.started,
+            "phases" : phases
+        }
+
+    #Writes the report to path as JSON
+    def write(self, path):
+        dirPath = os.path.dirname(path)
+        if dirPath and not os.path.isdir(dirPath):
+            os.makedirs(dirPath)
+        with open(path, "w") as fp:
+            json.dump(self.report(), fp, indent=2)
+        doxymwglobal.msg(doxymwglobal.msgType.info, "Metrics written to " + path)
+
+#The metrics of this run
+metrics = DoxyMWMetrics()
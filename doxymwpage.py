@@ -1,35 +1,64 @@
 import re
+import sys
+import html
 import hashlib
 import os
+import importlib.util
 
 import pywikibot
-from pywikibot import pagegenerators
-from pywikibot.pagegenerators import GeneratorFactory
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 
 import doxymwglobal
+from doxymwhashes import hashCache
+
+#Parser BeautifulSoup should use, lxml is a lot faster if it's installed
+htmlParser = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
 
 #Small class for generating title and displayTitle
 #This doesnt include namespace, fragment, or anything else, just titles
 # + title - Normalized title
 # + displayTitle - The least normalized title. Depends on your use of avoid
 class DoxyMWTitle(object):
+    __slots__ = ("title", "_displayTitle")
+    
+    #Every DoxyMWTitle made through get, keyed by title and avoid
+    #The same titles come up over and over (categories, images, links) so they share one DoxyMWTitle
+    registry = {}
+    
+    #Every title normalize was given, to what it normalized to or the DoxyMWException saying why it couldn't be
+    normalized = {}
+    
+    #MediaWiki's title rules (Title::secureAndSplit), checked here so no pywikibot.Link (and no site) is needed
+    illegalPattern = re.compile("[\\x00-\\x1f\\x23\\x3c\\x3e\\x5b\\x5d\\x7b\\x7c\\x7d\\x7f]|%[0-9A-Fa-f]{2}|&[A-Za-z0-9\\x80-\\xff]+;|&#[0-9]+;|&#x[0-9A-Fa-f]+;")
+    relativePattern = re.compile("^\\.\\.?(/|$)|/\\.\\.?(/|$)")
+    namespaces = ("(Media|Special|Talk|User|User talk|Project|Project talk|File|File talk|Image|Image talk|MediaWiki|MediaWiki talk|"
+        "Template|Template talk|Help|Help talk|Category|Category talk)")
+    emptyNamespacePattern = re.compile("^" + namespaces + " *:$", re.I)
+    #A namespace whose title starts with a colon, like C++ scopes ("File::Reader Class Reference")
+    namespaceColonPattern = re.compile("^" + namespaces + " *: *:", re.I)
+    underscorePattern = re.compile("_")
+    spacesPattern = re.compile(" +")
+
+    #Returns the DoxyMWTitle for title, only making a new one the first time a title is asked for
+    @staticmethod
+    def get(title, avoid=True):
+        key = (title, avoid)
+        normtitle = DoxyMWTitle.registry.get(key)
+        if not normtitle:
+            normtitle = DoxyMWTitle(title, avoid)
+            DoxyMWTitle.registry[key] = normtitle
+        return normtitle
 
     def __init__(self, title, avoid=True):
         #Soft normalize first to avoid possible mismatch between normalized and non-normalized
         if avoid:
             title = DoxyMWTitle.softNorm(title)
-    
-        self.reasonFail = "No failure occured"
         
         self.title = DoxyMWTitle.normalize(title)
         self._displayTitle = None
         #Non-normalized title != normalized, we need a display title (if supported by config)
         if title != self.title and doxymwglobal.config["mediaWiki_useFullDisplayTitle"]:
-            self._displayTitle = title
-            
-        if self.title == None:
-            raise DoxyMWException("Title failed normalization. " + self.reasonFail)
+            self._displayTitle = sys.intern(title)
     
     @property
     def displayTitle(self):
@@ -45,39 +74,68 @@ class DoxyMWTitle(object):
     #A softer less destructive normalization based on some MediaWiki title rules
     @staticmethod
     def softNorm(title):
-        normtitle = re.sub("_", " ", title) #_ are ' 's in MediaWiki titles
-        normtitle = re.sub(" +", " ", normtitle) #' 's are collapsed to one space
+        normtitle = DoxyMWTitle.underscorePattern.sub(" ", title) #_ are ' 's in MediaWiki titles
+        normtitle = DoxyMWTitle.spacesPattern.sub(" ", normtitle) #' 's are collapsed to one space
         normtitle = normtitle.strip() #Leading and trailing spaces are stripped
         normtitle = normtitle[:1].capitalize() + normtitle[1:] #And the first letter is capitalized
         return normtitle
     
-    #Normalize a title and test to see if it passes the Link test. If we fail, return None
-    #We may fail because this doesn't normalize ALL titles but most. New checks may be added to pywikibot later too
+    #Why title isn't a valid MediaWiki title, None if it is
+    #Namespaces are only the default ones, the wiki isn't asked for its own
+    @staticmethod
+    def invalidReason(title):
+        if not title.strip():
+            return "Title is empty"
+        if "\ufffd" in title:
+            return "Title contains the replacement character"
+        if DoxyMWTitle.illegalPattern.search(title):
+            return "Title contains illegal characters"
+        if "." in title and DoxyMWTitle.relativePattern.search(title):
+            return "Title contains a relative path (. or ..)"
+        if "~~~" in title:
+            return "Title contains ~~~"
+        if len(title.encode("utf-8")) > 255:
+            return "Title is over 255 bytes"
+        if DoxyMWTitle.emptyNamespacePattern.match(title):
+            return "Title is only a namespace"
+        if DoxyMWTitle.namespaceColonPattern.match(title):
+            return "Title starts with a namespace followed by a colon"
+        return None
+    
+    #Normalize a title and check it against the title rules. If we fail, raise a DoxyMWException
+    #We may fail because this doesn't normalize ALL titles but most
     #All invalid characters replaced with ! (And then we rely on the fact that there's display titles)
     @staticmethod
     def hardNorm(title):
-        #Replace illegal sequences with !
-        normtitle = re.sub(pywikibot.Link.illegal_titles_pattern, "!", title)
-        #Truncate to 255 bytes
-        if len(normtitle) > 255:
-            normtitle = normtitle[:255]
-    
-        #Test it with pywikibot.Link
-        try:
-            link = pywikibot.Link(normtitle)
-            link.parse() #Will cause it to fail if not a valid title
-        except pywikibot.InvalidTitle as e: #Something else was wrong
-            self.reasonFail = str(e)
-            return None
+        #Replace illegal sequences with ! (and the colon after a namespace that would start the title)
+        normtitle = DoxyMWTitle.illegalPattern.sub("!", title)
+        normtitle = DoxyMWTitle.namespaceColonPattern.sub(lambda match: match.group(0)[:-1] + "!", normtitle)
+        #Truncate to 255 bytes (without splitting a character)
+        if len(normtitle) > 63 and len(normtitle.encode("utf-8")) > 255:
+            normtitle = normtitle.encode("utf-8")[:255].decode("utf-8", "ignore")
         
+        reason = DoxyMWTitle.invalidReason(normtitle)
+        if reason:
+            raise doxymwglobal.DoxyMWException("Title " + title + " failed normalization. " + reason)
         return normtitle
     
-    #Chain the two together
+    #Chain the two together, each title is only ever normalized once
     @staticmethod
     def normalize(title):
-        return DoxyMWTitle.hardNorm(DoxyMWTitle.softNorm(title))
+        normtitle = DoxyMWTitle.normalized.get(title)
+        if normtitle == None:
+            try:
+                normtitle = sys.intern(DoxyMWTitle.hardNorm(DoxyMWTitle.softNorm(title)))
+            except doxymwglobal.DoxyMWException as e:
+                normtitle = e
+            DoxyMWTitle.normalized[title] = normtitle
+        
+        if isinstance(normtitle, doxymwglobal.DoxyMWException):
+            raise doxymwglobal.DoxyMWException(str(normtitle))
+        return normtitle
         
 #Strategies for updating pages - Used by pages classes to determine how to "put" their contents
+#updatePage returns True if the page on the wiki holds pageData's contents afterwards (whether we saved it or it was already the same)
 class DoxyMWStrategy(object):
     def __init__(self, canCreate=True, canEdit=True, checkPageEdit=None):
         self.canCreate = canCreate
@@ -107,22 +165,29 @@ class DoxyMWStrategy(object):
         
     def deletePage(self, pageData, page):
         raise NotImplementedError("Abstract method should be implemented")
+    
+    #The text pageData's page would get if it didn't exist yet, for exports
+    def exportText(self, pageData):
+        return pageData.mwcontents
 
 #We own the entire page, just update it directly    
 class FullPageStrategy(DoxyMWStrategy):
     def updatePage(self, pageData, page):
         if not self.checkPage(page):
-            doxymwglobal.msg(doxymwglobal.msgType.debug, "Page " + page.title() + " failed strategy edit check for pageData " + pageData.mwtitle)
+            doxymwglobal.msg(doxymwglobal.msgType.debug, lambda: "Page " + page.title() + " failed strategy edit check for pageData " + pageData.mwtitle)
             return False
             
         try:
             if page.exists() and not page.isRedirectPage():
                 page.get()
                 if page.text == pageData.mwcontents:
-                    return False #Don't need to make or update
+                    pageData.revid = page.latest_revision_id
+                    return True #Don't need to make or update
                     
             page.text = pageData.mwcontents
             page.save()
+            pageData.revid = page.latest_revision_id
+            pageData.changed = True
         except (pywikibot.LockedPage, pywikibot.EditConflict, pywikibot.SpamfilterError) as e:
             doxymwglobal.msg(doxymwglobal.msgType.warning, "Page " + page.title() + " could not be updated: " + str(e))
             return False
@@ -131,7 +196,7 @@ class FullPageStrategy(DoxyMWStrategy):
     
     def deletePage(self, page):
         if not self.checkPage(page):
-            doxymwglobal.msg(doxymwglobal.msgType.debug, "Page " + page.title() + " failed strategy edit check.")
+            doxymwglobal.msg(doxymwglobal.msgType.debug, lambda: "Page " + page.title() + " failed strategy edit check.")
             return False
             
         try:
@@ -155,12 +220,16 @@ class SectionStrategy(DoxyMWStrategy):
         self.endDelim = endDelim
 
     def updatePage(self, pageData, page):
-        return self._updatePage(pageData.mwcontents, page)
+        if not self._updatePage(pageData.mwcontents, page):
+            return False
+        pageData.revid = page.latest_revision_id
+        pageData.changed = True
+        return True
     
     
     def _updatePage(self, contents, page):
         if not self.checkPage(page):
-            doxymwglobal.msg(doxymwglobal.msgType.debug, "Page " + page.title() + " failed strategy edit check.")
+            doxymwglobal.msg(doxymwglobal.msgType.debug, lambda: "Page " + page.title() + " failed strategy edit check.")
             return False
         
         try:
@@ -195,43 +264,60 @@ class SectionStrategy(DoxyMWStrategy):
         
     def deletePage(self, page):
         return self._updatePage("", page)
+    
+    def exportText(self, pageData):
+        return self.startDelim + "\n" + pageData.mwcontents + "\n" + self.endDelim
         
 #For updating files (images)
 class FileStrategy(FullPageStrategy):
     #Same delete but different updatePage
     def updatePage(self, pageData, page):
         if not self.checkPage(page):
-            doxymwglobal.msg(doxymwglobal.msgType.debug, "Page " + page.title() + " failed strategy edit check for pageData " + pageData.mwtitle)
+            doxymwglobal.msg(doxymwglobal.msgType.debug, lambda: "Page " + page.title() + " failed strategy edit check for pageData " + pageData.mwtitle)
             return False
         
-        site = pywikibot.Site() #TODO: Bad, replace this
-        filePage = pywikibot.FilePage(site, pageData.normtitle.title)
+        #Files need the remote state (updatePages always sets it), it has the backend to upload with
+        #and the listing of all our files with the sha1s of everything we uploaded before
+        site = DoxyMWPage.remote.getSite(pageData.mwtitle)
+        filePage = site.filePage(pageData.normtitle.title)
         
         #If page exists, test hash against uploaded image
+        currSha1 = DoxyMWPage.remote.getFileSha1s(ImagePage.globalCategory.mwtitle).get(page.title())
         try:
-            #Throws exception on no page existing (NoPage)
-            currSha1 = filePage.latest_file_info.sha1
+            if not currSha1 and page.exists():
+                #Throws exception on no page existing (NoPage)
+                currSha1 = filePage.latest_file_info.sha1
             
             #Check the sha1 so we don't update needlessly
             if currSha1 == pageData.sha1:
-                doxymwglobal.msg(doxymwglobal.msgType.debug, "File " + pageData.mwtitle + " skipped because hashes were equal")
-                return False
+                doxymwglobal.msg(doxymwglobal.msgType.debug, lambda: "File " + pageData.mwtitle + " skipped because hashes were equal")
+                return True
         except pywikibot.exceptions.NoPage:
             pass
         
         #Otherwise upload that bad boy/girl/non-binary gender entity
-        doxymwglobal.msg(doxymwglobal.msgType.info, "File " + pageData.mwtitle + " being uploaded")
-        site.upload(filePage, source_filename=pageData.filepath + "/" + pageData.filename, comment=pageData.mwcontents, ignore_warnings=True)
+        doxymwglobal.msg(doxymwglobal.msgType.info, lambda: "File " + pageData.mwtitle + " being uploaded")
+        site.upload(filePage, pageData.filepath + "/" + pageData.filename, pageData.mwcontents)
+        pageData.changed = True
         return True
 
 #An base class for all other page types
 #This class shouldn't be used directly though
+#Every page class has __slots__, there can be a lot of pages around at once
 class DoxyMWPage(object):
+    __slots__ = ("sortKey", "categories", "revid", "changed", "rendered", "strategy", "normtitle")
+    
+    #Remote state of the wiki preloaded by the site (a DoxyMWRemoteState), None when nothing is preloaded
+    remote = None
+    
     #Basic functionality of this class
     #Sets up basic permissions on what we can do for the page, enforced in checkPage
     def __init__(self, normtitle=None, updateStrategy=None):
         self.sortKey = None
         self.categories = []
+        self.revid = None #Revision id on the wiki after the last updatePage, if known
+        self.changed = False #Whether the last updatePage actually changed the page on the wiki
+        self.rendered = None #(mwcontents, mwhash) once rendered, cleared by invalidate
         if not updateStrategy or not isinstance(updateStrategy, DoxyMWStrategy):
             raise TypeError("updateStrategy must be a DoxyMWStrategy")
         self.strategy = updateStrategy
@@ -256,6 +342,21 @@ class DoxyMWPage(object):
     
     def addCategory(self, cat):
         self.categories.append(cat)
+        self.invalidate()
+    
+    #Forgets the rendered contents, for when something they're made from changes
+    def invalidate(self):
+        self.rendered = None
+    
+    #Drops whatever is only needed to render the page once it's rendered, nothing can change the page after this
+    def compact(self):
+        pass
+    
+    #Drops the rendered contents once the page is on the wiki, only the hash is kept
+    #Pages that were compacted can't be rendered again
+    def release(self):
+        if self.rendered:
+            self.rendered = (None, self.rendered[1])
 
     #Stuff that should be overriden based on your uses
     @property #Should return a list of pages to make
@@ -268,27 +369,46 @@ class DoxyMWPage(object):
     def mwtitle(self):
         raise NotImplementedError("Abstract class property should be implemented")
         
-    @property #Should return the MediaWiki page contents
-    def mwcontents(self):
+    #Should append the MediaWiki page contents to parts (a list of strings joined once by mwcontents)
+    def render(self, parts):
         #Display title
-        str = "\n" + self.normtitle.mwdisplaytitle
+        parts.append("\n" + self.normtitle.mwdisplaytitle)
         #All categories (self.sortKey is shared between all categories unforntunately, no better way to do this atm)
         sortKeyStr = ""
         if self.sortKey:
             sortKeyStr = "|" + self.sortKey
         for cat in self.categories:
-            str += "\n[[" + cat.mwtitle + sortKeyStr + "]]"
-            
-        return str
+            parts.append("\n[[" + cat.mwtitle + sortKeyStr + "]]")
+    
+    #The MediaWiki page contents, rendered the first time they're asked for and kept until invalidate (or release)
+    @property
+    def mwcontents(self):
+        if not self.rendered or self.rendered[0] == None:
+            parts = []
+            self.render(parts)
+            contents = "".join(parts)
+            self.rendered = (contents, self.contentsHash(contents))
+        return self.rendered[0]
     
-    #Should get the page from the mediawiki given the site
+    #The hash kept for the given rendered contents, see mwhash
+    def contentsHash(self, contents):
+        return hashlib.sha1(contents.encode("utf-8")).hexdigest()
+    
+    #Hash of the MediaWiki page contents, used to tell if a page changed since we last put it
+    @property
+    def mwhash(self):
+        if not self.rendered:
+            self.mwcontents #Renders it if it isn't already
+        return self.rendered[1]
+    
+    #Should get the page from the mediawiki given the site (a DoxyMWBackend)
     def getPage(self, site):
-        gen = pagegenerators.PagesFromTitlesGenerator([self.mwtitle])
-        try:
-            page = gen.__next__()
-            return page
-        except StopIteration as e:
-            raise doxymwglobal.DoxyMWException("No page generated in generator")
+        if DoxyMWPage.remote:
+            page = DoxyMWPage.remote.getPage(self.mwtitle)
+            if page:
+                return page
+        
+        return site.page(self.mwtitle)
     
     #Returns the strategy this page should use
     @staticmethod
@@ -306,8 +426,10 @@ class DoxyMWPage(object):
         return self.strategy.deletePage(page)
         
 class CategoryPage(DoxyMWPage):
+    __slots__ = ("hidden",)
+    
     def __init__(self, title, parent=None, hidden=False, **kwargs):
-        super().__init__(normtitle=DoxyMWTitle(title), updateStrategy=CategoryPage.getStrategy(**kwargs))
+        super().__init__(normtitle=DoxyMWTitle.get(title), updateStrategy=CategoryPage.getStrategy(**kwargs))
         if parent:
             self.addCategory(parent)
         self.hidden = hidden
@@ -320,21 +442,27 @@ class CategoryPage(DoxyMWPage):
     def mwtitle(self):
         return "Category:" + self.normtitle.title
     
-    @property
-    def mwcontents(self):
-        hiddenCat = ""
+    def render(self, parts):
         if self.hidden:
-            hiddenCat = "__HIDDENCAT__"
-            
-        return hiddenCat + super().mwcontents
+            parts.append("__HIDDENCAT__")
+        super().render(parts)
     
-    def isInCategory(self, page):
+    #Whether the pywikibot.Page is in this category (and is a redirect if redirectOnly)
+    def isInCategory(self, page, redirectOnly=False):
+        #Look it up in the listing of the whole category if we have one
+        if DoxyMWPage.remote:
+            return page.title() in DoxyMWPage.remote.getMembers(self.mwtitle, redirectOnly)
+        
+        if redirectOnly and not page.isRedirectPage():
+            return False
         for pageCategory in page.categories():
             if pageCategory.title() == self.mwtitle:
                 return True
         return False
         
 class DoxygenHTMLPage(DoxyMWPage):
+    __slots__ = ("filepath", "filename", "type", "data", "infoBoxPages", "imgs", "anchors")
+    
     #Config values to change how the pages are made
     globalPrefix = None
     if "mediaWiki_docsPrefix" in doxymwglobal.config and doxymwglobal.config["mediaWiki_docsPrefix"] != "":
@@ -354,6 +482,18 @@ class DoxygenHTMLPage(DoxyMWPage):
     else:
         raise doxymwglobal.ConfigException("A nav category must be defined")
     
+    #Doxygen puts the time it ran in the footer ("Generated on <date> for <project> by")
+    #Left in, every page would be different every run and get saved again even if nothing changed
+    footerTimestamp = re.compile("Generated on\\s.*?\\s(for|by)\\s", re.S)
+    
+    #What scan looks for, the same things extractInternal does but straight from the text Doxygen writes
+    scanHeader = re.compile("<div class=\"header\">")
+    scanTitle = re.compile("<div class=\"title\">([^<]*)</div>")
+    scanSkip = re.compile("<!--.*?-->|<script\\b.*?</script>", re.S)
+    scanSkipOpen = re.compile("<!--|<script\\b")
+    scanIds = re.compile("<[a-zA-Z][a-zA-Z0-9]*(?:\\s[^<>]*?)?\\sid=\"([^\"]*)\"")
+    scanNames = re.compile("<a(?:\\s[^<>]*?)?\\sname=\"([^\"]*)\"")
+    
     @staticmethod
     def getStrategy(**kwargs):
         def checkPageEdit(page):
@@ -361,7 +501,8 @@ class DoxygenHTMLPage(DoxyMWPage):
             return DoxygenHTMLPage.globalCategory.isInCategory(page)
         return FullPageStrategy(checkPageEdit=checkPageEdit, **kwargs)
     
-    def __init__(self, fp, fn, type, **kwargs):
+    #extract=False leaves the page empty for setResult to fill in
+    def __init__(self, fp, fn, type, extract=True, **kwargs):
         #TODO:We set normtitle late in this class, fix this
         super().__init__(normtitle=None, updateStrategy=DoxygenHTMLPage.getStrategy(**kwargs))
         
@@ -370,40 +511,103 @@ class DoxygenHTMLPage(DoxyMWPage):
             raise doxymwglobal.DoxyMWException("File " + fp + "/" + fn + " does not exist")
     
         #About the file this page came from (every file is a page)
-        self.filepath = fp
+        self.filepath = sys.intern(fp) #The same for every page
         self.filename = fn
         
         #About the page itself
         self.type = type
         self.normtitle = None
         self.data = None
-        self.infoBoxPages = []
+        self.infoBoxPages = () #Can be shared between pages, see setInfoBoxPages
         self.imgs = []
+        self.anchors = set() #All the ids in the file that links can point to
         
         #Add categories
         self.addCategory(DoxygenHTMLPage.globalCategory)
         
         #Extract all the data
-        self.extract()
+        if extract:
+            self.extract()
+    
+    #Gets the title and anchors of a Doxygen file without parsing it, for the link index
+    #The title is only looked for in the first doxygen_scanBytes characters
+    #The rest of the file is read doxygen_scanBytes characters at a time (see scanParts) so it's never all in memory
+    #Returns (title, anchors), or None when the file has to be parsed to tell (an odd title, or it's missing something extract needs)
+    @staticmethod
+    def scan(fp, fn):
+        size = doxymwglobal.config["doxygen_scanBytes"]
+        with open(fp + "/" + fn) as f:
+            text = f.read(size)
+            header = DoxygenHTMLPage.scanHeader.search(text)
+            if not header:
+                return None
+            title = DoxygenHTMLPage.scanTitle.search(text, header.end())
+            if not title:
+                return None
+            
+            anchors = set()
+            contents = False
+            footer = False
+            for part in DoxygenHTMLPage.scanParts(f, text, size):
+                contents = contents or "<div class=\"contents\">" in part
+                footer = footer or "<address class=\"footer\">" in part
+                part = DoxygenHTMLPage.scanSkip.sub("", part)
+                anchors.update(html.unescape(id) for id in DoxygenHTMLPage.scanIds.findall(part))
+                anchors.update(html.unescape(name) for name in DoxygenHTMLPage.scanNames.findall(part))
+        
+        if not contents or not footer:
+            return None
+        return (html.unescape(title.group(1)), anchors)
+    
+    #Splits the rest of the file f (after text, what's already been read of it) into parts that can be scanned on their own
+    #A part never ends inside a tag, a comment or a script, whatever's left over goes in front of the next read
+    @staticmethod
+    def scanParts(f, text, size):
+        while True:
+            more = f.read(size)
+            if not more:
+                yield text
+                return
+            text += more
+            
+            #Anything after the last comment or script that's complete can still be the start of one
+            end = 0
+            for skip in DoxygenHTMLPage.scanSkip.finditer(text):
+                end = skip.end()
+            cut = text.rfind("<", end)
+            if cut < 0:
+                cut = len(text)
+            unclosed = DoxygenHTMLPage.scanSkipOpen.search(text, end)
+            if unclosed:
+                cut = min(cut, unclosed.start())
+            
+            yield text[:cut]
+            text = text[cut:]
     
     #Extracts all the data from the file at self.filepath
     def extract(self):
-        fp = open(self.filepath + "/" + self.filename)
+        with open(self.filepath + "/" + self.filename) as fp:
+            text = fp.read()
     
         #Extract the specific parts of the page for the wiki
-        self.data = self.extractInternal(fp.read())
+        self.data = self.extractInternal(text)
         if not self.data:
             raise doxymwglobal.DoxyMWException("Not enough content in doxygen document to create MediaWiki page in " + self.filename)
-            
-        #Set title
-        self.normtitle = DoxyMWTitle(self.data["title"], avoid=False)
+        self.setTitle(self.data["title"])
+    
+    #Sets the title and everything that depends on it
+    def setTitle(self, title):
+        self.normtitle = DoxyMWTitle(title, avoid=False)
         
         #Sorting doesn't work too well with the original names
         #We reverse the order of the parts of the name from class to highest namespace
         self.sortKey = ".".join(reversed(self.normtitle.title.split(".")))
+        self.invalidate()
     
     #Converts all the data in this page to proper MediaWiki markup
-    def convert(self, wikiPages):
+    #The extracted tags are rewritten in place and only serialized once here
+    #linkIndex is the DoxygenLinkIndex of all the pages being converted
+    def convert(self, linkIndex):
         for key, value in self.data.items():
             if key == "title":
                 continue
@@ -411,34 +615,81 @@ class DoxygenHTMLPage(DoxyMWPage):
             if isinstance(value, list):
                 values = []
                 for v in value:
-                    newValue, newImgs = self.convertInternal(v, wikiPages)
+                    newValue, newImgs = self.convertInternal(v, linkIndex)
                     values.append(newValue)
-                    self.imgs += newImgs
+                    self.addImgs(newImgs)
                     
                 self.data[key] = values
             else:
-                self.data[key], newImgs = self.convertInternal(value, wikiPages)
-                self.imgs += newImgs
+                self.data[key], newImgs = self.convertInternal(value, linkIndex)
+                self.addImgs(newImgs)
+    
+    #Adds ImagePages used by the page, each only once
+    def addImgs(self, imgs):
+        for img in imgs:
+            if img not in self.imgs:
+                self.imgs.append(img)
+    
+    #Everything convert produced in a compact, picklable form (for passing pages between processes)
+    def getResult(self):
+        return {
+            "filepath" : self.filepath,
+            "filename" : self.filename,
+            "type" : self.type,
+            "data" : self.data,
+            "anchors" : self.anchors,
+            "imgs" : [img.filename for img in self.imgs]
+        }
+    
+    #Makes a converted page from the result of getResult without touching the Doxygen file again
+    @staticmethod
+    def fromResult(result):
+        page = DoxygenHTMLPage(result["filepath"], result["filename"], result["type"], extract=False)
+        page.data = result["data"]
+        page.anchors = result["anchors"]
+        page.setTitle(page.data["title"])
+        page.addImgs([ImagePage.get(page.filepath, img) for img in result["imgs"]])
+        return page
     
     #Add a page to the list for that will go into the info box
     def addInfoBoxPage(self, page):
-        self.infoBoxPages.append(page)
+        self.infoBoxPages = self.infoBoxPages + (page,)
+        self.invalidate()
+    
+    #Sets all the pages that go into the info box at once, pages (a tuple) is shared and not copied
+    def setInfoBoxPages(self, pages):
+        self.infoBoxPages = pages
+        self.invalidate()
+    
+    #The converted data is only needed to render
+    def compact(self):
+        self.mwhash #Renders it if it isn't already
+        self.data = None
+        self.infoBoxPages = ()
+        self.anchors = None
     
     #Gets the transclusion page this DoxygenHTML page should be referenced by
     def getTransclusionPage(self):
         return TransclusionPage(self.normtitle, self)
     
     #Function that returns data extracted from Doxygen file for MediaWiki page
+    #The file is only parsed this once, everything but the title is kept as tags (detached from the rest of the document) for convert
     #Returns a dictionary with
     # + title: The title of the Doxygen file, straight unicode
-    # + nav: List of <a> tags from the upper breadcrumb like navigation thing
-    # + summary: Links in the summary div (like "List of members, Public members, Protected members" etc...)
+    # + nav: List of tags each holding an <a> from the upper breadcrumb like navigation thing
+    # + summary: List of tags each holding a link in the summary div (like "List of members, Public members, Protected members" etc...)
     # + contents: The body of the Doxygen file
-    # + footer: The html of the bottom of the page with the build time and doxygen logo
+    # + footer: The bottom of the page with the doxygen logo (build time removed)
     def extractInternal(self, text):
-        soup = BeautifulSoup(text)
+        soup = BeautifulSoup(text, htmlParser)
         data = {}
         
+        #Takes a tag out of the document inside a new tag of its own
+        def detach(tag):
+            holder = soup.new_tag("div")
+            holder.append(tag.extract())
+            return holder
+        
         def onlyOne(tagList, which):
             if len(tagList) <= 0:
                 doxymwglobal.msg(doxymwglobal.msgType.debug, "No " + which + " found")
@@ -453,6 +704,12 @@ class DoxygenHTMLPage(DoxyMWPage):
             return None
         data["title"] = select.decode_contents(formatter=None) #Straight unicode
         
+        #Find everything that can be linked to
+        for tag in soup.select("[id]"):
+            self.anchors.add(tag.attrs["id"])
+        for tag in soup.select("a[name]"):
+            self.anchors.add(tag.attrs["name"])
+        
         #Find the nav
         data["nav"] = []
         select = onlyOne(soup.select("#nav-path > ul"), "nav")
@@ -460,7 +717,7 @@ class DoxygenHTMLPage(DoxyMWPage):
             pass #May not be present, so we just leave this an an empty array
         else:
             for tag in select.select("li > a.el"):
-                data["nav"].append(tag.decode(formatter="html"))
+                data["nav"].append(detach(tag))
         
         #Find the summary links
         data["summary"] = []
@@ -469,28 +726,30 @@ class DoxygenHTMLPage(DoxyMWPage):
             pass #May not be present, so we just leave this an an empty array
         else:
             for tag in select.select("a"):
-                data["summary"].append(tag.decode(formatter="html"))
+                data["summary"].append(detach(tag))
         
         #Find the contents
         select = onlyOne(soup.select("div.contents"), "contents")
         if not select:
             return None
-        data["contents"] = select.decode_contents(formatter="html")
+        data["contents"] = select.extract()
         
-        #Footer for attribution and compile time info
+        #Footer for attribution info (without the compile time)
         select = onlyOne(soup.select("address.footer"), "footer")
         if not select:
             return None
-        data["footer"] = select.decode_contents(formatter="html")
+        for string in select.find_all(string=DoxygenHTMLPage.footerTimestamp):
+            string.replace_with(DoxygenHTMLPage.footerTimestamp.sub("Generated \\1 ", string))
+        data["footer"] = select.extract()
         
         return data
         
     #Function that translates all HTML to MediaWiki markup with the least amount of work
+    #tag is rewritten in place in a single walk over the tree
     #Returns two objects in a tuple
-    # + text contains the translated HTML for the wiki
+    # + text contains the translated HTML (contents of tag) for the wiki
     # + imgs contains all identified images that should be uploaded
-    def convertInternal(self, text, wikiPages):
-        soup = BeautifulSoup(text)
+    def convertInternal(self, tag, linkIndex):
         imgs = []
         
         #Output of doxygen
@@ -507,8 +766,23 @@ class DoxygenHTMLPage(DoxyMWPage):
         #<img src="..." ...>
         #<map>
         
+        #Rewrite the tags we care about, anything we replace isn't walked into
+        def walk(parent):
+            for child in list(parent.children):
+                if not isinstance(child, Tag):
+                    continue
+                if child.name == "a":
+                    child.replace_with(convertA(child))
+                elif child.name == "img":
+                    child.replace_with(convertImg(child))
+                elif child.name == "map":
+                    #For now just delete them, we'll have to rely on a MW extension for this one later
+                    child.decompose()
+                else:
+                    walk(child)
+        
         #Convert <a>s
-        for a in soup("a"):
+        def convertA(a):
             #A normal link
             newStr = None
             if "href" in a.attrs:
@@ -522,18 +796,18 @@ class DoxygenHTMLPage(DoxyMWPage):
                 else:
                     link = href
                 
-                #Compare to list of wiki pages and change if necessary
+                #Compare to the index of wiki pages and change if necessary
                 internalLink = False
                 if link == "" and (fragment == "" or fragment == "#"): #Empty link
                     newStr = ""
                 elif link == "": #Local link with only fragment
                     internalLink = True
+                    linkIndex.resolve(self, href, self.filename, fragment)
                 else: #Test if it matches an internal file, if not, external link
-                    for page in wikiPages:
-                        if link == page.filename:
-                            internalLink = True
-                            link = page.normtitle.title
-                            break
+                    title = linkIndex.resolve(self, href, link, fragment)
+                    if title:
+                        internalLink = True
+                        link = title
                 
                 #What's the content?
                 text = a.string
@@ -545,7 +819,7 @@ class DoxygenHTMLPage(DoxyMWPage):
                         newStr = "[[" + link + fragment + "|" + text + "]]"
                 elif len(tags) == 1 and tags[0].name == "img": #One image inside the a tag
                     img = tags[0]
-                    imgs.append(ImagePage(self.filepath, img.attrs["src"]))
+                    imgs.append(ImagePage.get(self.filepath, img.attrs["src"]))
                     newStr = "[[File:" + img.attrs["src"] + "|link=" + link + fragment + "]]"
                 else: #Something else
                     doxymwglobal.msg(doxymwglobal.msgType.debug, "Unhandled link with unknown contents")
@@ -553,7 +827,7 @@ class DoxygenHTMLPage(DoxyMWPage):
             
             #A named anchor or anchor with ID
             elif "name" in a.attrs or "id" in a.attrs:
-                newStr = soup.new_tag("span")
+                newStr = Tag(name="span")
                 #Named anchors or ID'd anchors just become spans with IDs
                 if "name" in a.attrs:
                     newStr.attrs["id"] = a.attrs["name"]
@@ -564,23 +838,18 @@ class DoxygenHTMLPage(DoxyMWPage):
             else:
                 newStr = ""
                 
-            a.replace_with(newStr)
+            return newStr
             
         #Convert and store <img>s
-        for img in soup("img"):
+        def convertImg(img):
             #File this image for later use
-            imgs.append(ImagePage(self.filepath, img.attrs["src"]))
+            imgs.append(ImagePage.get(self.filepath, img.attrs["src"]))
             
             #Convert the image
-            newStr = "[[File:" + img.attrs["src"] + "]]"
-            img.replace_with(newStr)
-            
-        #Convert <maps>
-        #For now just delete them, we'll have to rely on a MW extension for this one later
-        for map in soup("map"):
-            map.replace_with("") 
-            
-        return (soup.decode_contents(formatter="html"), imgs)
+            return "[[File:" + img.attrs["src"] + "]]"
+        
+        walk(tag)
+        return (tag.decode_contents(formatter="html"), imgs)
     
     @property
     def newPages(self):
@@ -595,68 +864,104 @@ class DoxygenHTMLPage(DoxyMWPage):
     def mwtitle(self):
         return DoxygenHTMLPage.globalPrefix + " " + self.normtitle.title
     
-    #Gets the page contents
-    @property
-    def mwcontents(self):
+    #Renders the page contents
+    def render(self, parts):
         #Do not use <img>, <a>, or other non-MediaWiki accepted HTML tags in here!
         
+        parts.append("<noinclude>" +
+        "\n'''''Do not edit this autogenerated page.'''''" +
+        "\n''Edits will be lost upon running DoxyMWBot again. " +
+        ("Edit [{{fullurl:" + self.normtitle.title + "|redirect=no}} " + self.normtitle.title + "] instead." if
+        doxymwglobal.config["mediaWiki_setupTransclusions"]
+        else "You must turn on transclusion to generate pages for you to add your content.") + "''" +
+        "</noinclude>")
+        
         #Build the infobox
+        navCategoryType = "Category:" + DoxygenHTMLPage.globalNavCategory.normtitle.title + " " + self.type
+        parts.append("\n<!--DoxyMWBot Infobox (modelled after Wikipedia's)-->" +
+        "<div class=\"doxymw_infobox\">" +
+        "<div class=\"head\">DoxyMWBot</div>" + 
+        "<div>Type: <span class=\"doxymw_type doxymw_type" + self.type + "\">[[:" + navCategoryType + "]]</span></div>")
+        
         #Nav breadcrumb sort of thing
-        navStr = ""
         if len(self.data["nav"]) > 0:
-            navStr = "<div>Nav: <div class=\"doxymw_nav\">"
+            parts.append("<div>Nav: <div class=\"doxymw_nav\">")
             for i in range(0, len(self.data["nav"])):
-                tag = self.data["nav"][i]
-                navStr += "<div>" + tag + "</div>"
+                parts.append("<div>" + self.data["nav"][i] + "</div>")
                 if i < len(self.data["nav"])-1: #Only add The dividers if it's not the last one
-                    navStr += "<div>V</div>"
-            navStr += "</div></div>"
+                    parts.append("<div>V</div>")
+            parts.append("</div></div>")
         
         #Summary links
-        summaryStr = ""
-        if len(self.data["summary"]) > 0:
-            for tag in self.data["summary"]:
-                summaryStr += "<div>" + tag + "</div>"
+        for tag in self.data["summary"]:
+            parts.append("<div>" + tag + "</div>")
     
-        extraStr = ""
-        if len(self.infoBoxPages) > 0:
-            for page in self.infoBoxPages:
-                extraStr += "<div>[[" + page.mwtitle + "|" + page.normtitle.displayTitle + "]]</div>"
-    
-        navCategoryType = "Category:" + DoxygenHTMLPage.globalNavCategory.normtitle.title + " " + self.type
-    
-        infobox = (
-        "<!--DoxyMWBot Infobox (modelled after Wikipedia's)-->" +
-        "<div class=\"doxymw_infobox\">" +
-        "<div class=\"head\">DoxyMWBot</div>" + 
-        "<div>Type: <span class=\"doxymw_type doxymw_type" + self.type + "\">[[:" + navCategoryType + "]]</span></div>" +
-        navStr +
-        summaryStr +
-        extraStr +
-        "</div>" +
-        "<!--End DoxyMWBot Infobox-->")
+        for page in self.infoBoxPages:
+            parts.append("<div>[[" + page.mwtitle + "|" + page.normtitle.displayTitle + "]]</div>")
         
-        return ("<noinclude>" +
-        "\n'''''Do not edit this autogenerated page.'''''" +
-        "\n''Edits will be lost upon running DoxyMWBot again. " +
-        ("Edit [{{fullurl:" + self.normtitle.title + "|redirect=no}} " + self.normtitle.title + "] instead." if
-        doxymwglobal.config["mediaWiki_setupTransclusions"]
-        else "You must turn on transclusion to generate pages for you to add your content.") + "''" +
-        "</noinclude>" +
+        parts.append("</div>" +
+        "<!--End DoxyMWBot Infobox-->")
         
-        #The doxygen infobox and actual page contents
-        "\n" + infobox +
-        "\n" + self.data["contents"] + 
-        "\n" + self.data["footer"] + "| <small>DoxyMWBot is in no way affiliated with Doxygen.</small>" +
+        #The actual page contents
+        parts.append("\n")
+        parts.append(self.data["contents"])
+        parts.append("\n")
+        parts.append(self.data["footer"])
+        parts.append("| <small>DoxyMWBot is in no way affiliated with Doxygen.</small>")
         
         #Other stuff
-        "\n<noinclude>" +
-        super().mwcontents +
-        "\n</noinclude>"
-        )
+        parts.append("\n<noinclude>")
+        super().render(parts)
+        parts.append("\n</noinclude>")
+        
+
+#Index of all the DoxygenHTMLPages being converted so links between them resolve with one lookup
+#Only holds plain data so it can be handed to other processes
+#Also collects the links that couldn't be resolved while converting
+# + titles - Normalized page titles keyed by filename
+# + anchors - Sets of anchor ids keyed by filename
+# + unresolved - Set of (filename, href) for relative links to files we don't have a page for
+# + dangling - Set of (filename, href) for links to a page we have but an anchor it doesn't
+class DoxygenLinkIndex(object):
+    #Links with a scheme (http:, mailto:, ...) are external and never resolve to a page
+    externalLink = re.compile("^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+    def __init__(self, wikiPages=()):
+        self.titles = {}
+        self.anchors = {}
+        for page in wikiPages:
+            self.add(page.filename, page.normtitle.title, page.anchors)
+        self.unresolved = set()
+        self.dangling = set()
+    
+    def add(self, filename, title, anchors):
+        self.titles[filename] = title
+        self.anchors[filename] = anchors
+    
+    #Returns the title of the page the link (filename and "#fragment") in fromPage points to or None
+    def resolve(self, fromPage, href, link, fragment):
+        title = self.titles.get(link)
+        if not title:
+            if not DoxygenLinkIndex.externalLink.match(link):
+                self.unresolved.add((fromPage.filename, href))
+            return None
         
+        if fragment not in ("", "#") and fragment[1:] not in self.anchors[link]:
+            self.dangling.add((fromPage.filename, href))
+        return title
+    
+    #Reports the links that didn't resolve
+    def report(self):
+        for filename, href in sorted(self.unresolved):
+            doxymwglobal.msg(doxymwglobal.msgType.debug, "Unresolved link " + href + " in " + filename)
+        for filename, href in sorted(self.dangling):
+            doxymwglobal.msg(doxymwglobal.msgType.debug, "Dangling fragment " + href + " in " + filename)
+        if len(self.unresolved) > 0 or len(self.dangling) > 0:
+            doxymwglobal.msg(doxymwglobal.msgType.info, str(len(self.unresolved)) + " unresolved links and " + str(len(self.dangling)) + " dangling fragments")
 
 class TransclusionPage(DoxyMWPage):
+    __slots__ = ("target",)
+    
     #Config values to change how the pages are made
     globalPrefix = None
     if "mediaWiki_transclusionPrefix" in doxymwglobal.config and doxymwglobal.config["mediaWiki_transclusionPrefix"] != "":
@@ -672,7 +977,7 @@ class TransclusionPage(DoxyMWPage):
     def getStrategy(**kwargs):
         def checkPageEdit(page):
             #Must have our category and should only edit redirects (never edit a user editted transclusion page)
-            return TransclusionPage.globalCategory.isInCategory(page) and page.isRedirectPage()
+            return TransclusionPage.globalCategory.isInCategory(page, redirectOnly=True)
         return FullPageStrategy(checkPageEdit=checkPageEdit, **kwargs)
 
     def __init__(self, normtitle, target, **kwargs):
@@ -688,87 +993,105 @@ class TransclusionPage(DoxyMWPage):
         return ((TransclusionPage.globalPrefix + " " if TransclusionPage.globalPrefix else "")
             + self.normtitle.title)
     
-    @property
-    def mwcontents(self):
-        infoText = (
+    def render(self, parts):
+        parts.append("#REDIRECT [[" + self.target.mwtitle + "]]" +
             "\n<!--"
             "\nTo add content alongside your coding documentation, you must edit this page."
             "\nRemove the redirect and add the text {{:" + self.target.mwtitle + "}} to transclude the coding documentation on this page"
             "\nIf you choose, you can rerun DoxyMWBot to append a transclusion to every non-redirect page you have created"
             "\n-->"
-        )
-    
-        return "#REDIRECT [[" + self.target.mwtitle + "]]" + infoText + "\n" + super().mwcontents
+            "\n")
+        super().render(parts)
 
 class ImagePage(DoxyMWPage):
+    __slots__ = ("filepath", "filename")
+    
     globalCategory = CategoryPage(DoxygenHTMLPage.globalCategory.normtitle.title + " IMAGE", parent=DoxygenHTMLPage.globalCategory)
+    
+    #Every ImagePage made through get, keyed by file path
+    #Doxygen pages share a lot of images (closed.png, open.png, the logo, ...) so they share the ImagePage too
+    registry = {}
 
     @staticmethod
     def getStrategy(**kwargs):
         return FileStrategy(**kwargs)
     
+    #Returns the ImagePage for the file, only making a new one the first time a file is asked for
+    @staticmethod
+    def get(fp, fn):
+        path = os.path.normpath(fp + "/" + fn)
+        page = ImagePage.registry.get(path)
+        if not page:
+            page = ImagePage(fp, fn)
+            ImagePage.registry[path] = page
+        return page
+    
     def __init__(self, fp, fn, **kwargs):
-        super().__init__(normtitle=DoxyMWTitle(fn), updateStrategy=ImagePage.getStrategy(**kwargs), **kwargs)
+        super().__init__(normtitle=DoxyMWTitle.get(fn), updateStrategy=ImagePage.getStrategy(**kwargs), **kwargs)
         
         #Check validity of file
         if not os.path.isfile(fp + "/" + fn):
             raise doxymwglobal.DoxyMWException("File " + fp + "/" + fn + " does not exist")
     
-        self.filepath = fp
+        self.filepath = sys.intern(fp)
         self.filename = fn
         self.addCategory(ImagePage.globalCategory)
-        
-        #Check the sha1 for checking against the currently uploaded image later
-        fp = open(self.filepath + "/" + self.filename, "rb")
-        sha1 = hashlib.sha1()
-        sha1.update(fp.read())
-        self.sha1 = sha1.hexdigest()
+    
+    #The sha1 for checking against the currently uploaded image
+    @property
+    def sha1(self):
+        return hashCache.sha1(self.filepath + "/" + self.filename)
     
     @property
     def mwtitle(self):
         return "File:" + self.normtitle.title
     
-    @property
-    def mwcontents(self):
-        return "Autogenerated Doxygen Image\n" + super().mwcontents
+    def render(self, parts):
+        parts.append("Autogenerated Doxygen Image\n")
+        super().render(parts)
+    
+    #The description page and the file itself both have to match
+    def contentsHash(self, contents):
+        return hashlib.sha1((self.sha1 + contents).encode("utf-8")).hexdigest()
         
 class BotUserPage(DoxyMWPage):
+    __slots__ = ()
 
     @staticmethod
     def getStrategy(**kwargs):
         return FullPageStrategy(**kwargs)
 
     def __init__(self, site, **kwargs):
-        super().__init__(normtitle=DoxyMWTitle(site.user()), updateStrategy=BotUserPage.getStrategy(**kwargs))
+        super().__init__(normtitle=DoxyMWTitle.get(site.user()), updateStrategy=BotUserPage.getStrategy(**kwargs))
         self.addCategory(DoxygenHTMLPage.globalCategory)
         
         if not os.path.isfile("./README.md"):
-            raise doxymwglobal.DoxyMWException("File " + file + " does not exist")
+            raise doxymwglobal.DoxyMWException("File ./README.md does not exist")
         
     @property
     def mwtitle(self):
         return "User:" + self.normtitle.title
     
-    @property
-    def mwcontents(self):
-        fp = open("./README.md", "rt")
-        readme = "\n" + fp.read() + "\n"
-    
-        return (
-            "<nowiki>Hello, I am DoxyMWBot >:]" +
+    #The README is only read the first time the page is rendered
+    def render(self, parts):
+        parts.append("<nowiki>Hello, I am DoxyMWBot >:]" +
             "\n" + "This project is in no way affiliated with Doxygen" +
             "\n" + "More stuff will go here eventually, a FAQ, better description, etc" +
-            readme + "</nowiki>" + super().mwcontents
-        )
+            "\n")
+        with open("./README.md", "rt") as fp:
+            parts.append(fp.read())
+        parts.append("\n</nowiki>")
+        super().render(parts)
         
 class StylesPage(DoxyMWPage):
+    __slots__ = ("files",)
 
     @staticmethod
     def getStrategy(**kwargs):
         return SectionStrategy(startDelim="/*START DOXYMWBOT*/", endDelim="/*END DOXYMWBOT*/", **kwargs)
 
     def __init__(self, **kwargs):
-        super().__init__(normtitle=DoxyMWTitle("MediaWiki:Common.css"), updateStrategy=StylesPage.getStrategy(**kwargs))
+        super().__init__(normtitle=DoxyMWTitle.get("MediaWiki:Common.css"), updateStrategy=StylesPage.getStrategy(**kwargs))
         self.files = ["./modifiedDoxygenStyles.css", "./doxymwbotStyles.css"]
         
         for file in self.files:
@@ -779,14 +1102,12 @@ class StylesPage(DoxyMWPage):
     def mwtitle(self):
         return "MediaWiki:Common.css"
     
-    @property
-    def mwcontents(self):
-        putText = ""
-        
+    #The stylesheets are only read the first time the page is rendered
+    def render(self, parts):
         #Read each of our stylesheets
         for file in self.files:
-            fp = open(file, "rt")
-            putText += "\n" + fp.read() + "\n"
-            
-        return putText
+            with open(file, "rt") as fp:
+                parts.append("\n")
+                parts.append(fp.read())
+                parts.append("\n")
         
\ No newline at end of file
@@ -0,0 +1,118 @@
+import threading
+import queue
+import collections
+import multiprocessing
+
+import doxymwglobal
+from doxymwpage import DoxygenHTMLPage
+from doxymwxml import DoxygenXMLPage
+
+#Reads and converts Doxygen docs as streams, optionally over a pool of processes
+#Parsing is CPU bound so the pool scales with the number of cores
+#convert can't start until the whole link index is known so every file goes through two passes,
+#one for the title and anchors that go into the link index and one to actually convert it
+#The first pass streams through the text without parsing it (see DoxygenHTMLPage.scan) so only conversion parses
+#and holds a whole file in memory, only the files scan can't make sense of are parsed in both passes
+#Converted pages are passed back from the pool with DoxygenHTMLPage.getResult
+#The pool's processes are spawned, not forked, the pool is made on the prefetch thread while the upload threads
+#and pywikibot's connections are running and a forked child could be left holding one of their locks
+
+#The link index of a worker process, set by _initWorker
+_linkIndex = None
+
+def _initWorker(option, config, linkIndex=None):
+    global _linkIndex
+    #Options and some config (see doxymwbench.py) are set at run time so spawned processes wouldn't have them
+    doxymwglobal.option.update(option)
+    doxymwglobal.config.update(config)
+    _linkIndex = linkIndex
+
+#The page class of the reader for a doc's output (HTML or XML)
+def _pageClass(doc):
+    if doc[1].endswith(".xml"):
+        return DoxygenXMLPage
+    return DoxygenHTMLPage
+
+#Reads a doc with the reader for its output
+def _makePage(doc):
+    return _pageClass(doc)(*doc)
+
+#Returns what the link index needs to know about a doc
+#The doc is only parsed here when scan can't tell, otherwise it would be parsed again by _convert
+def _index(doc):
+    scanned = _pageClass(doc).scan(doc[0], doc[1])
+    if scanned:
+        return (doc,) + scanned
+    page = _makePage(doc)
+    return (doc, page.data["title"], page.anchors)
+
+#Returns the converted doc and the links in it that didn't resolve
+def _convert(doc):
+    _linkIndex.unresolved = set()
+    _linkIndex.dangling = set()
+    page = _makePage(doc)
+    page.convert(_linkIndex)
+    return (page.getResult(), _linkIndex.unresolved, _linkIndex.dangling)
+
+#Calls func on every item in a pool of jobs processes, yielding the results in order
+#Only a few items are in flight at once so results don't pile up faster than they're used
+def _poolMap(func, items, jobs, initargs):
+    ahead = jobs * 2
+    with multiprocessing.get_context("spawn").Pool(jobs, _initWorker, initargs) as pool:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= ahead:
+                yield pending.popleft().get()
+        while len(pending) > 0:
+            yield pending.popleft().get()
+
+#Reads the title and anchors of every doc (as returned by findDoxygenHTMLDocs or findDoxygenXMLDocs) with jobs processes
+#Yields (doc, title, anchors) tuples
+def indexDocs(docs, jobs=1):
+    if jobs > 1:
+        yield from _poolMap(_index, docs, jobs, (doxymwglobal.option, doxymwglobal.config))
+    else:
+        for doc in docs:
+            yield _index(doc)
+
+#Converts every doc (as returned by findDoxygenHTMLDocs or findDoxygenXMLDocs) with jobs processes
+#Yields converted DoxygenHTMLPages, links that don't resolve are collected in linkIndex
+def convertDocs(docs, linkIndex, jobs=1):
+    if jobs > 1:
+        for result, unresolved, dangling in _poolMap(_convert, docs, jobs, (doxymwglobal.option, doxymwglobal.config, linkIndex)):
+            doxymwglobal.msg(doxymwglobal.msgType.info, lambda: "Converted " + result["filename"])
+            linkIndex.unresolved |= unresolved
+            linkIndex.dangling |= dangling
+            yield DoxygenHTMLPage.fromResult(result)
+    else:
+        for doc in docs:
+            doxymwglobal.msg(doxymwglobal.msgType.info, lambda: "Converting " + doc[1])
+            page = _makePage(doc)
+            page.convert(linkIndex)
+            yield page
+
+#Runs the iterable in a background thread, at most size items ahead of whoever is using them
+#Lets conversion carry on while the pages before it are being sent to the wiki
+def prefetch(iterable, size):
+    items = queue.Queue(maxsize=size)
+    done = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put((item, None))
+        except BaseException as e:
+            items.put((done, e))
+            return
+        items.put((done, None))
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    while True:
+        item, e = items.get()
+        if item is done:
+            if e:
+                raise e
+            return
+        yield item
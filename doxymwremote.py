@@ -0,0 +1,86 @@
+import threading
+
+import doxymwglobal
+
+#In-memory map of the state of pages on the wiki
+#Filled in batches so the strategies don't have to ask the wiki about every page separately
+#site is a DoxyMWBackend
+# + pages - pywikibot.Page (or whatever the backend uses) keyed by our mwtitle, with text, existence and redirect status already loaded
+# + sites - The backend each of the pages was loaded through, so they're saved as the same bot user (for sharded updates)
+# + members - The pages in a category (with existence and redirect status loaded) keyed by title, keyed by category title
+#   Kept for the whole run so finding stale pages at the end doesn't have to list the categories again
+# + redirects - Sets of the titles of the redirects in a category, keyed by category title
+# + fileSha1s - sha1 of the latest upload of the files in a category keyed by file title, keyed by category title
+class DoxyMWRemoteState(object):
+    def __init__(self, site):
+        self.site = site
+        self.pages = {}
+        self.sites = {}
+        self.members = {}
+        self.redirects = {}
+        self.fileSha1s = {}
+        self.membersLock = threading.Lock() #Members are asked for from the worker threads
+
+    #Loads the given titles from the wiki through site (this state's site by default), batchSize titles per request
+    def preload(self, titles, batchSize=None, site=None):
+        if not site:
+            site = self.site
+        if not batchSize:
+            batchSize = doxymwglobal.config["mediaWiki_preloadBatchSize"]
+        titles = [title for title in titles if title not in self.pages]
+        if len(titles) == 0:
+            return
+
+        #Text, existence and redirect status (prop=revisions|info)
+        newPages = {}
+        for title in titles:
+            newPages[title] = site.page(title)
+            self.sites[title] = site
+        site.preload(newPages.values(), batchSize)
+        self.pages.update(newPages)
+        doxymwglobal.msg(doxymwglobal.msgType.debug, "Preloaded " + str(len(titles)) + " pages")
+
+    #Forgets the given titles so their text can be freed
+    def release(self, titles):
+        for title in titles:
+            self.pages.pop(title, None)
+            self.sites.pop(title, None)
+
+    #The preloaded pywikibot.Page for mwtitle or None if it wasn't preloaded
+    def getPage(self, mwtitle):
+        return self.pages.get(mwtitle)
+
+    #The backend mwtitle was preloaded through
+    def getSite(self, mwtitle):
+        return self.sites.get(mwtitle, self.site)
+    
+    #The pages in category (title with "Category:") keyed by title
+    #Listed from the wiki the first time it's asked for and then kept for the rest of the run
+    def getMemberPages(self, category):
+        with self.membersLock:
+            if category not in self.members:
+                members = dict((page.title(), page) for page in self.site.categoryMembers(category))
+                self.members[category] = members
+                doxymwglobal.msg(doxymwglobal.msgType.debug, "Listed " + str(len(members)) + " pages in " + category)
+            return self.members[category]
+
+    #The titles of all the pages in category (title with "Category:"), optionally only the redirects
+    #Both come from the one listing of getMemberPages
+    def getMembers(self, category, redirectsOnly=False):
+        members = self.getMemberPages(category)
+        if not redirectsOnly:
+            return members.keys()
+        with self.membersLock:
+            if category not in self.redirects:
+                self.redirects[category] = set(title for title, page in members.items() if page.isRedirectPage())
+            return self.redirects[category]
+
+    #The sha1s of all the files in category (title with "Category:") keyed by file title
+    #Listed from the wiki the first time it's asked for and then kept for the rest of the run
+    def getFileSha1s(self, category):
+        with self.membersLock:
+            if category not in self.fileSha1s:
+                sha1s = self.site.fileSha1s(category)
+                self.fileSha1s[category] = sha1s
+                doxymwglobal.msg(doxymwglobal.msgType.debug, "Listed " + str(len(sha1s)) + " files in " + category)
+            return self.fileSha1s[category]
@@ -0,0 +1,74 @@
+import queue
+import hashlib
+import threading
+
+import doxymwglobal
+
+#Splits an update between several DoxyMWSites (each can be logged in as a different bot user) so the
+#per user edit rate limit of the wiki isn't the limit of the whole update
+#Every page always goes to the same shard (by a hash of its title) so each shard can keep its own manifest
+
+#Which of count shards the page with the given title belongs to
+def shardOf(title, count):
+    return int(hashlib.sha1(title.encode("utf-8")).hexdigest()[:8], 16) % count
+
+#One shard, runs DoxyMWSite.updatePages on its own thread with the pages it's given through put
+class DoxyMWShard(object):
+    _done = object()
+
+    def __init__(self, site, index, count, journal=None):
+        self.site = site
+        self.journal = journal
+        self.index = index
+        self.count = count
+        self.queue = queue.Queue(maxsize=doxymwglobal.config["mediaWiki_preloadBatchSize"] * 2)
+        self.result = None
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        manifest = self.site.openManifest((self.index, self.count))
+        try:
+            self.result = self.site.updatePages(self.pages(), manifest, self.journal)
+        except BaseException as e:
+            self.error = e
+        finally:
+            manifest.close()
+
+    def pages(self):
+        while True:
+            item = self.queue.get()
+            if item is DoxyMWShard._done:
+                return
+            yield item
+
+    #Raises whatever stopped the shard if it's not running anymore
+    def check(self):
+        if not self.thread.is_alive():
+            raise self.error if self.error else doxymwglobal.DoxyMWException("Shard " + str(self.index) + " stopped early")
+
+    #Hands a page (or a threading.Event, see DoxyMWSite.updatePages) to the shard
+    def put(self, item):
+        while True:
+            self.check()
+            try:
+                self.queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    #Blocks until everything put so far is on the wiki
+    def flush(self):
+        event = threading.Event()
+        self.put(event)
+        while not event.wait(1):
+            self.check()
+
+    #Waits for the shard to finish, returns the result of updatePages
+    def finish(self):
+        self.put(DoxyMWShard._done)
+        self.thread.join()
+        if self.error:
+            raise self.error
+        return self.result
@@ -1,22 +1,42 @@
 import re
+import os
+import glob
+import threading
 
 import pywikibot
-from pywikibot import pagegenerators
-from pywikibot.pagegenerators import GeneratorFactory
 
 import doxymwglobal
-from doxymwpage import DoxygenHTMLPage, CategoryPage, BotUserPage, TransclusionPage, ImagePage, StylesPage
+from doxymwhashes import hashCache
+from doxymwmetrics import metrics
+from doxymwjournal import DoxyMWJournal
+from doxymwmanifest import DoxyMWManifest
+from doxymwremote import DoxyMWRemoteState
+from doxymwworkers import DoxyMWWorkerPool
+from doxymwshards import DoxyMWShard, shardOf
+from doxymwpage import DoxyMWPage, DoxygenHTMLPage, CategoryPage, BotUserPage, TransclusionPage, ImagePage, StylesPage
 
+#site is a DoxyMWBackend
 class DoxyMWSite(object):
     def __init__(self, site):
         self.site = site
+        self.workers = DoxyMWWorkerPool()
         site.login()
          
+    #Identifies this site and bot user for the manifest and the journal
+    def siteKey(self):
+        return str(self.site) + ":" + str(self.site.user())
     
-    #Returns a generator that matches all DoxyMWPages (Pages that we FULLY own)
-    #pywikibot=True gives a traditional pywikibot generator
-    #pywikibot=False gives a list of tuples with a generator and a strategy based on the page so we can work on all pages
-    def generator(self, pywikibot=True):
+    #Opens the local manifest for this site and bot user
+    #shard is (index, count) for the manifest of one shard of a sharded update
+    def openManifest(self, shard=None):
+        path = doxymwglobal.config["mediaWiki_manifestPath"]
+        if shard:
+            path += ".shard" + str(shard[0]) + "of" + str(shard[1])
+        return DoxyMWManifest(path, self.siteKey())
+    
+    #Returns a list of tuples with a generator and a strategy that between them match all DoxyMWPages (Pages that we FULLY own)
+    #so we can work on all pages
+    def generator(self):
         docsCategory = DoxygenHTMLPage.globalCategory
         docsImgCategory = ImagePage.globalCategory
         transCategory = TransclusionPage.globalCategory
@@ -25,181 +45,354 @@ class DoxyMWSite(object):
         stylesPage = StylesPage()
         
         #Generator for categories
-        fac = GeneratorFactory(site=self.site)
-        fac.handleArg("-page:" + docsCategory.mwtitle)
-        fac.handleArg("-subcatsr:" + docsCategory.normtitle.title)
-        fac.handleArg("-page:" + transCategory.mwtitle)
-        fac.handleArg("-page:" + navCategory.mwtitle)
-        fac.handleArg("-subcatsr:" + navCategory.normtitle.title)
-        fac.handleArg("-page:" + docsImgCategory.mwtitle)
-        genCat = fac.getCombinedGenerator()
-        
-        #Generator for DoxyHTMLPages
-        fac = GeneratorFactory(site=self.site)
-        fac.handleArg("-cat:" + docsCategory.normtitle.title)
-        genDoxy = fac.getCombinedGenerator()
-        
-        #Generator for Images
-        fac = GeneratorFactory(site=self.site)
-        fac.handleArg("-cat:" + docsImgCategory.normtitle.title)
-        genImg = fac.getCombinedGenerator()
-        
-        #Generator for TransclusionPages
-        fac = GeneratorFactory(site=self.site)
-        fac.handleArg("-cat:" + transCategory.normtitle.title)
-        genTrans = fac.getCombinedGenerator()
-        if pywikibot:
-            #Select only redirect transclusion pages
-            debugFiltered = doxymwglobal.option["printLevel"].value <= doxymwglobal.msgType.debug.value
-            genTrans = pagegenerators.RedirectFilterPageGenerator(genTrans, no_redirects=False, show_filtered=debugFiltered)
-        
-        #Generators for other pages
-        fac = GeneratorFactory(site=self.site)
-        fac.handleArg("-page:" + botUserPage.mwtitle)
-        genUser = fac.getCombinedGenerator()
-        fac = GeneratorFactory(site=self.site)
-        fac.handleArg("-page:" + stylesPage.mwtitle)
-        genStyles = fac.getCombinedGenerator()
-        
-        
-        #Combined generator
-        if pywikibot:
-            return pagegenerators.CombinedPageGenerator([genCat, genDoxy, genImg, genTrans, genUser]) #No genStyles because we don't fully own it
-        else:
-            ret = []
-            ret.append((genCat,CategoryPage.getStrategy()))
-            ret.append((genDoxy,DoxygenHTMLPage.getStrategy()))
-            ret.append((genImg,ImagePage.getStrategy()))
-            ret.append((genTrans,TransclusionPage.getStrategy()))
-            ret.append((genUser,BotUserPage.getStrategy()))
-            ret.append((genStyles,StylesPage.getStrategy()))
-            return ret
+        def genCat():
+            yield from self.site.pages([docsCategory.mwtitle])
+            yield from self.site.subcategories(docsCategory.mwtitle)
+            yield from self.site.pages([transCategory.mwtitle, navCategory.mwtitle])
+            yield from self.site.subcategories(navCategory.mwtitle)
+            yield from self.site.pages([docsImgCategory.mwtitle])
+        
+        #Pages in a category, the remote state (when there is one) has already listed most of them during this run
+        def genMembers(category):
+            if DoxyMWPage.remote:
+                yield from DoxyMWPage.remote.getMemberPages(category).values()
+            else:
+                yield from self.site.categoryMembers(category)
+        
+        ret = []
+        ret.append((genCat(),CategoryPage.getStrategy()))
+        ret.append((genMembers(docsCategory.mwtitle),DoxygenHTMLPage.getStrategy())) #DoxyHTMLPages
+        ret.append((genMembers(docsImgCategory.mwtitle),ImagePage.getStrategy())) #Images
+        ret.append((genMembers(transCategory.mwtitle),TransclusionPage.getStrategy())) #TransclusionPages
+        ret.append((self.site.pages([botUserPage.mwtitle]),BotUserPage.getStrategy()))
+        ret.append((self.site.pages([stylesPage.mwtitle]),StylesPage.getStrategy()))
+        return ret
     
     #CLEANUP - Cleans up MOST of DoxyMWBot's content from the wiki
     #Note: This deletes all uploaded doxygen docs and any transclusions that are just redirects
     #It will leave all other content alone
     def cleanup(self):
-        tuples = self.generator(pywikibot=False)
-        for tup in tuples:
-            gen = tup[0]
-            strat = tup[1]
+        #Nothing we put on the wiki will be left, so the manifest is meaningless
+        manifest = self.openManifest()
+        manifest.clear()
+        manifest.close()
+        for path in glob.glob(doxymwglobal.config["mediaWiki_manifestPath"] + ".shard*"):
+            os.remove(path)
+        #Or any update left to resume
+        if os.path.isfile(doxymwglobal.config["mediaWiki_journalPath"]):
+            os.remove(doxymwglobal.config["mediaWiki_journalPath"])
+        
+        #Ownership checks look pages up in listings of our categories
+        DoxyMWPage.remote = DoxyMWRemoteState(self.site)
+        with metrics.phase("deletion"):
+            self.deletePages(self.findStalePages(set()))
+        DoxyMWPage.remote = None
+    
+    #Finds every page we own on the wiki whose title isn't in the set keepTitles
+    #Returns a list of (pywikibot.Page, strategy) tuples
+    def findStalePages(self, keepTitles):
+        stale = {}
+        for gen, strat in self.generator():
             for page in gen:
-                if not page.exists():
-                    continue
-                try:
-                    if strat.deletePage(page):
-                        doxymwglobal.msg(doxymwglobal.msgType.info, "Page " + page.title() + " deleted")
-                except (pywikibot.LockedPage, pywikibot.EditConflict, pywikibot.SpamfilterError) as e:
-                    doxymwglobal.msg(doxymwglobal.msgType.warning, "Page " + page.title() + " could not be deleted: " + str(e))
+                title = page.title()
+                #Pages can be listed more than once (like a category in our category), the first listing decides the strategy
+                if title in keepTitles or title in stale:
                     continue
+                stale[title] = (page, strat)
+        
+        #Pages from category listings already know they exist, only the few asked for by title need checking
+        return [(page, strat) for page, strat in stale.values() if page.exists()]
+    
+    #Purges the cache of the pages with the given titles, many titles per request
+    #Titles the journal (a DoxyMWJournal, optional) has as purged already are left alone
+    def purgePages(self, titles, journal=None):
+        if journal:
+            titles = [title for title in titles if not journal.isDone("purge", title)]
+        titles = sorted(titles)
+        batchSize = doxymwglobal.config["mediaWiki_purgeBatchSize"]
+        batches = [titles[i:i+batchSize] for i in range(0, len(titles), batchSize)]
+        
+        def purge(batch):
+            return self.site.purge(batch, doxymwglobal.config["mediaWiki_purgeForceLinkUpdate"])
+        
+        for batch, result in zip(batches, self.workers.map(purge, batches)):
+            if result:
+                metrics.count("purge", "pages", len(batch))
+                if journal:
+                    for title in batch:
+                        journal.record("purge", title)
+                doxymwglobal.msg(doxymwglobal.msgType.info, "Purged " + str(len(batch)) + " pages")
+            else:
+                doxymwglobal.msg(doxymwglobal.msgType.warning, "Pages " + ", ".join(batch) + " could not be purged")
+    
+    #Deletes (pywikibot.Page, strategy) tuples on the worker pool, recording them in the journal (a DoxyMWJournal, optional)
+    #Returns the titles of the pages that were deleted
+    def deletePages(self, pages, journal=None):
+        def delete(item):
+            page, strat = item
+            try:
+                return strat.deletePage(page)
+            except (pywikibot.LockedPage, pywikibot.EditConflict, pywikibot.SpamfilterError) as e:
+                doxymwglobal.msg(doxymwglobal.msgType.warning, "Page " + page.title() + " could not be deleted: " + str(e))
+                return False
+        
+        #Prompts can't be answered from more than one thread at a time
+        workers = self.workers
+        if doxymwglobal.option["interactive"]:
+            workers = DoxyMWWorkerPool(1)
+        
+        deleted = []
+        metrics.count("deletion", "stale", len(pages))
+        for (page, strat), result in zip(pages, workers.map(delete, pages)):
+            if result:
+                metrics.count("deletion", "pages")
+                doxymwglobal.msg(doxymwglobal.msgType.info, lambda: "Page " + page.title() + " deleted")
+                deleted.append(page.title())
+                if journal:
+                    journal.record("delete", page.title())
+        return deleted
             
     #UPDATE - Create/update all the wiki pages, deletes all old/unused pages
-    def update(self, wikiPages):
-        #Keep a list of pages we're going to add in the info box
-        infoBoxPages = set()
-        for pageData in wikiPages:
-            if pageData.type == "OTHER":
-                infoBoxPages.add(pageData)
+    #Sets up a DoxygenHTMLPage for the site (transclusion, nav categories, info box)
+    #Returns all the pages it produces
+    @staticmethod
+    def preparePage(pageData, infoBoxPages):
+        newPages = []
+        
+        #Transclusion Pages
+        navCategoryAdd = pageData
+        if doxymwglobal.config["mediaWiki_setupTransclusions"]:
+            transPageData = pageData.getTransclusionPage()
+            navCategoryAdd = transPageData
             
-        #Retrieve all the pages we're making into a set
-        allPages = set()
-        allCategories = set()
+        #NavCategory Stuff
+        navCategoryAdd.addCategory(CategoryPage(DoxygenHTMLPage.globalNavCategory.normtitle.title + " " + pageData.type, parent=DoxygenHTMLPage.globalNavCategory))
+        if not (doxymwglobal.config["mediaWiki_navCategoryExcludeMembers"] and pageData.type == "MEMBERS"):
+            navCategoryAdd.addCategory(DoxygenHTMLPage.globalNavCategory)
+    
+        #Add all the info box pages (every page shares the same tuple)
+        pageData.setInfoBoxPages(infoBoxPages)
         
-        #One shot pages we need to make
-        allPages.add(StylesPage())
-        if doxymwglobal.config["mediaWiki_makeUserPage"]:
-            botUserPage = BotUserPage(self.site)
-            allPages.add(botUserPage)
-            infoBoxPages.add(botUserPage)
+        #Data prepped, get all the pages
+        if doxymwglobal.config["mediaWiki_setupTransclusions"]:
+            newPages.extend(transPageData.newPages)
+        newPages.extend(pageData.newPages) #All pages produced by the DoxygenHTMLPage
+        return newPages
+    
+    #Generates every page that has to be put on the wiki, each only once
+    #Categories always come before the first page that's in them
+    @staticmethod
+    def allPages(wikiPages, infoBoxPages, onePages):
+        infoBoxPages = tuple(infoBoxPages)
+        done = set()
+        def newPagesGen():
+            yield onePages
+            for pageData in wikiPages:
+                yield DoxyMWSite.preparePage(pageData, infoBoxPages)
+        
+        for newPages in newPagesGen():
+            #Make sure categories go first! (sort is stable so the rest keep their order)
+            newPages.sort(key=lambda page: not isinstance(page, CategoryPage))
+            for page in newPages:
+                if page.mwtitle in done:
+                    continue
+                done.add(page.mwtitle)
+                yield page
+    
+    #Roughly how many bytes saving pageData sent to the wiki
+    def savedBytes(self, pageData):
+        size = len(pageData.mwcontents.encode("utf-8"))
+        if isinstance(pageData, ImagePage):
+            size += os.path.getsize(pageData.filepath + "/" + pageData.filename)
+        return size
+    
+    #Puts pages on the wiki in order, skipping the ones the manifest says are already there
+    #Works through them a batch at a time, fetching the state of each batch from the wiki up front
+    #and then saving the batch on the worker pool
+    #DoxyMWPage.remote must be set to a DoxyMWRemoteState
+    #A threading.Event in pages saves everything before it right away and is then set
+    #Every page that's done goes in the journal (a DoxyMWJournal, optional), pages the run being resumed already did are skipped
+    #Returns a tuple of the set of titles of all the pages that were handled and the set of titles of the ones that changed
+    def updatePages(self, pages, manifest, journal=None):
+        updatedPages = set()
+        changedPages = set()
+        batchSize = doxymwglobal.config["mediaWiki_preloadBatchSize"]
+        remote = DoxyMWPage.remote
+        
+        #Runs on the worker threads, returns the DoxyMWException instead of raising it
+        def save(item):
+            pageData, mwhash = item
+            try:
+                return pageData.updatePage(self.site)
+            except doxymwglobal.DoxyMWException as e:
+                return e
         
-        #Take the DoxygenHTMLPages and build the site
-        for pageData in wikiPages:
-            newPages = []
+        def updateBatch(batch):
+            batchTitles = [pageData.mwtitle for pageData, mwhash in batch]
+            remote.preload(batchTitles, site=self.site)
             
-            #Transclusion Pages
-            navCategoryAdd = pageData
-            if doxymwglobal.config["mediaWiki_setupTransclusions"]:
-                transPageData = pageData.getTransclusionPage()
-                navCategoryAdd = transPageData
-                
-            #NavCategory Stuff
-            navCategoryAdd.addCategory(CategoryPage(DoxygenHTMLPage.globalNavCategory.normtitle.title + " " + pageData.type, parent=DoxygenHTMLPage.globalNavCategory))
-            if not (doxymwglobal.config["mediaWiki_navCategoryExcludeMembers"] and pageData.type == "MEMBERS"):
-                navCategoryAdd.addCategory(DoxygenHTMLPage.globalNavCategory)
-        
-            #Add all the info box pages
-            for infoBoxPageData in infoBoxPages:
-                pageData.addInfoBoxPage(infoBoxPageData)
+            #Make sure categories go first! They're all saved before the rest of the batch starts
+            categories = [item for item in batch if isinstance(item[0], CategoryPage)]
+            others = [item for item in batch if not isinstance(item[0], CategoryPage)]
+            for group in (categories, others):
+                results = self.workers.map(save, group)
+                for (pageData, mwhash), result in zip(group, results):
+                    if isinstance(result, doxymwglobal.DoxyMWException):
+                        manifest.forget(pageData.mwtitle)
+                        metrics.count("upload", "failed")
+                        doxymwglobal.msg(doxymwglobal.msgType.warning, str(result))
+                        continue
+                    
+                    if result:
+                        manifest.record(pageData.mwtitle, mwhash, pageData.revid, type(pageData.strategy).__name__)
+                        if journal:
+                            journal.record("save" if pageData.changed else "check", pageData.mwtitle, mwhash)
+                    else:
+                        manifest.forget(pageData.mwtitle)
+                        metrics.count("upload", "failed")
+                    if pageData.changed:
+                        changedPages.add(pageData.mwtitle)
+                        metrics.count("upload", "saved")
+                        metrics.count("upload", "bytes", self.savedBytes(pageData))
+                    elif result:
+                        metrics.count("upload", "unchanged")
+                    #Only put in updatedPages if it was successful
+                    updatedPages.add(pageData.mwtitle)
+                    pageData.release()
+            remote.release(batchTitles)
+        
+        batch = []
+        for pageData in pages:
+            if isinstance(pageData, threading.Event):
+                if len(batch) > 0:
+                    updateBatch(batch)
+                    batch = []
+                pageData.set()
+                continue
+            
+            #Only the rendered contents are needed from here on
+            mwhash = pageData.mwhash
+            pageData.compact()
+            metrics.count("upload", "pages")
+            
+            #Skip anything the run being resumed already did
+            if journal and (journal.isDone("save", pageData.mwtitle, mwhash) or journal.isDone("check", pageData.mwtitle, mwhash)):
+                metrics.count("upload", "resumed")
+                doxymwglobal.msg(doxymwglobal.msgType.debug, lambda: "Page " + pageData.mwtitle + " already done before resuming")
+                #The manifest might not have been written out before the run stopped
+                manifest.record(pageData.mwtitle, mwhash, None, type(pageData.strategy).__name__)
+                if journal.isDone("save", pageData.mwtitle, mwhash):
+                    changedPages.add(pageData.mwtitle)
+                updatedPages.add(pageData.mwtitle)
+                pageData.release()
+                continue
             
-            #Data prepped, get all the pages
-            if doxymwglobal.config["mediaWiki_setupTransclusions"]:
-                newPages.extend(transPageData.newPages)
-            newPages.extend(pageData.newPages) #All pages produced by the DoxygenHTMLPage
+            #Skip anything the manifest says is already on the wiki
+            if not doxymwglobal.option["force"] and manifest.isCurrent(pageData.mwtitle, mwhash):
+                metrics.count("upload", "skipped")
+                doxymwglobal.msg(doxymwglobal.msgType.debug, lambda: "Page " + pageData.mwtitle + " unchanged since last run")
+                updatedPages.add(pageData.mwtitle)
+                pageData.release()
+                continue
             
-            #Filter out all categories and add them to a separate set
-            for page in newPages[:]:
-                if isinstance(page, CategoryPage):
-                    newPages.remove(page)
-                    allCategories.add(page)
-                
-            allPages = allPages.union(newPages)
+            batch.append((pageData, mwhash))
+            if len(batch) >= batchSize:
+                updateBatch(batch)
+                batch = []
+        if len(batch) > 0:
+            updateBatch(batch)
+        
+        return (updatedPages, changedPages)
+            
+    #UPDATE - Create/update all the wiki pages, deletes all old/unused pages
+    #wikiPages can be any iterable of converted DoxygenHTMLPages, it's only gone through once and nothing is kept
+    #so it can be a generator that converts pages as they're needed
+    #otherPages are the DoxygenHTMLPages of type "OTHER" (only their titles are used), they go in every info box
+    #Puts pages on the wiki split between the shardSites (DoxyMWSites), each page always goes to the same one
+    #Every category is on the wiki before anything after it is handed out
+    #Returns the same as updatePages once all the shards are done
+    def updateShards(self, pages, shardSites, journal=None):
+        shards = [DoxyMWShard(site, i, len(shardSites), journal) for i, site in enumerate(shardSites)]
+        for pageData in pages:
+            shard = shards[shardOf(pageData.mwtitle, len(shards))]
+            shard.put(pageData)
+            if isinstance(pageData, CategoryPage):
+                shard.flush()
+        
+        updatedPages = set()
+        changedPages = set()
+        for shard in shards:
+            updated, changed = shard.finish()
+            updatedPages |= updated
+            changedPages |= changed
+        return (updatedPages, changedPages)
+    
+    #shardSites is an optional list of DoxyMWSites to split the saving between (see updateShards)
+    #This site still finds and deletes the old pages, once every shard is done
+    #With the resume option, picks up the last update from its journal if it didn't finish
+    def update(self, wikiPages, otherPages, shardSites=None):
+        #Keep a list of pages we're going to add in the info box
+        infoBoxPages = list(otherPages)
+        
+        #One shot pages we need to make
+        onePages = [StylesPage()]
+        if doxymwglobal.config["mediaWiki_makeUserPage"]:
+            botUserPage = BotUserPage(self.site)
+            onePages.append(botUserPage)
+            infoBoxPages.append(botUserPage)
         
         #Update all the pages
-        updatedPages = []
-        allPages = list(allPages)
-        allPages[0:0] = list(allCategories) #Make sure categories go first!
-        for pageData in allPages:
+        manifest = self.openManifest()
+        journal = DoxyMWJournal(doxymwglobal.config["mediaWiki_journalPath"], self.siteKey(), doxymwglobal.option["resume"])
+        DoxyMWPage.remote = DoxyMWRemoteState(self.site)
+        with metrics.phase("upload"):
+            pages = self.allPages(wikiPages, infoBoxPages, onePages)
             try:
-                pageData.updatePage(self.site)
-                #Only put in updatedPages if it was successful
-                updatedPages.append(pageData.mwtitle)
-            except doxymwglobal.DoxyMWException as e:
-                doxymwglobal.msg(doxymwglobal.msgType.warning, str(e))
+                if shardSites:
+                    updatedPages, changedPages = self.updateShards(pages, shardSites, journal)
+                else:
+                    updatedPages, changedPages = self.updatePages(pages, manifest, journal)
+            except BaseException:
+                #Keep everything that got done (Ctrl-C included) for --resume
+                manifest.close()
+                journal.close()
+                raise
         
-        #Delete all old pages
+        #Delete all old pages (everything we own that we didn't just update)
+        with metrics.phase("deletion"):
+            stalePages = self.findStalePages(updatedPages)
         if "whichDelete" in doxymwglobal.option["debug"]:
+            #Debug which pages we're going to delete
             debugPath = doxymwglobal.debugPath()
             debugFp = open(debugPath + "/debug.txt", "w")
             debugFp.write("Updated\n")
             for item in updatedPages:
                 debugFp.write(item + "\n")
             debugFp.write("\n\nFinal")
+            for page, strat in stalePages:
+                debugFp.write(page.title() + "\n")
+        else:
+            with metrics.phase("deletion"):
+                deleted = self.deletePages(stalePages, journal)
+                #Pages the run being resumed deleted aren't on the wiki anymore, but the manifests might not know yet
+                deleted.extend(journal.doneTitles("delete"))
+                for title in deleted:
+                    manifest.forget(title)
+                #Shards keep their own manifests
+                if shardSites:
+                    for i, site in enumerate(shardSites):
+                        shardManifest = site.openManifest((i, len(shardSites)))
+                        for title in deleted:
+                            if shardOf(title, len(shardSites)) == i:
+                                shardManifest.forget(title)
+                        shardManifest.close()
+        manifest.close()
+        hashCache.save()
+        DoxyMWPage.remote = None
         
-        tuples = self.generator(pywikibot=False)
-        for tup in tuples:
-            gen = tup[0]
-            strat = tup[1]
-            for page in gen:
-                if not page.exists():
-                    continue
-                #Filter out update pages
-                if page.title() in updatedPages:
-                    continue
-                
-                #Debug which pages we're going to delete
-                if "whichDelete" in doxymwglobal.option["debug"]:
-                    debugFp.write(page.title() + "\n")
-                    continue
-                
-                #Delete the old page
-                try:
-                    if strat.deletePage(page):
-                        doxymwglobal.msg(doxymwglobal.msgType.info, "Page " + page.title() + " deleted")
-                except (pywikibot.LockedPage, pywikibot.EditConflict, pywikibot.SpamfilterError) as e:
-                    doxymwglobal.msg(doxymwglobal.msgType.warning, "Page " + page.title() + " could not be deleted: " + str(e))
-                    continue
-        
-        
-                
-        #Uncache mostly all the pages
-        gen = self.generator(pywikibot=True)
-        for page in gen:
-            try:
-                if not page.exists():
-                    continue
-                page.purge()
-                doxymwglobal.msg(doxymwglobal.msgType.info, "Page " + page.title() + " purged")
-            except (pywikibot.LockedPage, pywikibot.EditConflict, pywikibot.SpamfilterError) as e:
-                doxymwglobal.msg(doxymwglobal.msgType.warning, "Page " + page.title() + " could not be purged: " + str(e))
-                continue
+        #Uncache the pages that changed
+        with metrics.phase("purge"):
+            self.purgePages(changedPages, journal)
+        journal.end()
+        journal.close()
             
\ No newline at end of file
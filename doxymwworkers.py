@@ -0,0 +1,66 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pywikibot
+from pywikibot.data import api
+
+import doxymwglobal
+
+#Runs wiki operations (saves, deletes, ...) on a pool of threads
+#Every thread talks to the same wiki so when the wiki tells one of them to slow down (maxlag, rate limits, server errors)
+#all of them wait before sending anything else
+#pywikibot's put throttle still applies to every save, so the throttle in user-config.py caps how fast writes can go
+#Retry-After isn't used, pywikibot only hands back the body of a response so its headers never get here
+#pywikibot already retries 429 and 503 responses itself (retry_wait doubling up to max_retries in user-config.py)
+#and pauses for maxlag by the lag the error reports, this only backs off from what it gives up on
+class DoxyMWWorkerPool(object):
+    #API error codes that mean try again later
+    retryCodes = ("maxlag", "ratelimited", "readonly")
+
+    def __init__(self, threads=None):
+        self.threads = threads if threads else doxymwglobal.config["mediaWiki_workerThreads"]
+        self.lock = threading.Lock()
+        self.resumeAt = 0
+
+    #Blocks until the wiki is willing to hear from us again
+    def wait(self):
+        while True:
+            with self.lock:
+                delay = self.resumeAt - time.time()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+    #Makes every thread wait for at least the given seconds
+    def backoff(self, seconds):
+        with self.lock:
+            self.resumeAt = max(self.resumeAt, time.time() + seconds)
+        doxymwglobal.msg(doxymwglobal.msgType.info, "Wiki asked us to slow down, waiting " + str(seconds) + " seconds")
+
+    #Calls func(item), retrying with backoff when the wiki asks us to slow down
+    def run(self, func, item):
+        delay = doxymwglobal.config["mediaWiki_retryDelay"]
+        retries = doxymwglobal.config["mediaWiki_retries"]
+        for attempt in range(retries + 1):
+            self.wait()
+            try:
+                return func(item)
+            except api.APIError as e:
+                if e.code not in DoxyMWWorkerPool.retryCodes or attempt == retries:
+                    raise
+                #maxlag errors say how lagged the servers are
+                lag = getattr(e, "other", {}).get("lag")
+                self.backoff(max(delay, float(lag)) if lag else delay)
+            except pywikibot.ServerError:
+                if attempt == retries:
+                    raise
+                self.backoff(delay)
+            delay = delay * 2
+
+    #Calls func on every item on the pool, returning the results in order
+    def map(self, func, items):
+        if self.threads <= 1 or len(items) <= 1:
+            return [self.run(func, item) for item in items]
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            return list(executor.map(lambda item: self.run(func, item), items))
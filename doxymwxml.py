@@ -0,0 +1,296 @@
+import os
+import html
+import xml.etree.ElementTree as ElementTree
+
+import doxymwglobal
+from doxymwpage import DoxygenHTMLPage
+
+#Reader for Doxygen's XML output, an alternative to scraping the HTML output
+#Every compound (class, namespace, file, ...) is its own XML file that's read with a streaming iterparse,
+#so there's never a whole document tree in memory, and links come from Doxygen's own cross reference ids
+#instead of hrefs
+
+#Kinds of compounds we make pages for and the type they get (same types as the HTML reader)
+compoundTypes = {
+    "class" : "CLASS",
+    "struct" : "CLASS",
+    "union" : "CLASS",
+    "interface" : "INTERFACE",
+    "namespace" : "NAMESPACE",
+    "file" : "FILE"
+}
+
+#Headings for the member sections, anything else is made from the section kind
+sectionTitles = {
+    "public-type" : "Public Types",
+    "public-func" : "Public Member Functions",
+    "public-attrib" : "Public Attributes",
+    "public-static-func" : "Static Public Member Functions",
+    "public-static-attrib" : "Static Public Attributes",
+    "protected-type" : "Protected Types",
+    "protected-func" : "Protected Member Functions",
+    "protected-attrib" : "Protected Attributes",
+    "protected-static-func" : "Static Protected Member Functions",
+    "protected-static-attrib" : "Static Protected Attributes",
+    "package-func" : "Package Functions",
+    "package-attrib" : "Package Attributes",
+    "property" : "Properties",
+    "event" : "Events",
+    "typedef" : "Typedefs",
+    "enum" : "Enumerations",
+    "func" : "Functions",
+    "var" : "Variables",
+    "define" : "Macros"
+}
+
+#Headings for simplesects in descriptions
+simplesectTitles = {
+    "return" : "Returns",
+    "see" : "See also",
+    "note" : "Note",
+    "warning" : "Warning",
+    "remark" : "Remarks",
+    "since" : "Since",
+    "deprecated" : "Deprecated",
+    "exception" : "Exceptions"
+}
+
+#Description markup that maps straight onto HTML MediaWiki accepts
+simpleTags = {
+    "para" : ("<p>", "</p>"),
+    "computeroutput" : ("<code>", "</code>"),
+    "bold" : ("<b>", "</b>"),
+    "emphasis" : ("<i>", "</i>"),
+    "superscript" : ("<sup>", "</sup>"),
+    "subscript" : ("<sub>", "</sub>"),
+    "itemizedlist" : ("<ul>", "</ul>"),
+    "orderedlist" : ("<ol>", "</ol>"),
+    "listitem" : ("<li>", "</li>"),
+    "programlisting" : ("<pre>", "</pre>"),
+    "codeline" : ("", "\n"),
+    "parameterlist" : ("<dl>", "</dl>"),
+    "parametername" : ("<dt>", "</dt>"),
+    "parameterdescription" : ("<dd>", "</dd>"),
+    "table" : ("<table>", "</table>"),
+    "row" : ("<tr>", "</tr>"),
+    "entry" : ("<td>", "</td>")
+}
+
+#Finds the compounds in Doxygen's XML output we want to make pages for
+#Reads only index.xml, returns a list of (filepath, filename, type) tuples like findDoxygenHTMLDocs
+def findDoxygenXMLDocs():
+    xmlPath = os.path.abspath(doxymwglobal.config["doxygen_tmpPath"] + "/xml")
+    docs = []
+    for event, elem in ElementTree.iterparse(xmlPath + "/index.xml"):
+        if elem.tag != "compound":
+            continue
+        type = compoundTypes.get(elem.get("kind"))
+        if type and os.path.isfile(xmlPath + "/" + elem.get("refid") + ".xml"):
+            docs.append((xmlPath, elem.get("refid") + ".xml", type))
+        elem.clear()
+    return docs
+
+#Text made up of plain strings and cross references that are only resolved once all the pages are known
+class XMLFragments(object):
+    def __init__(self):
+        self.parts = []
+
+    def text(self, text):
+        if text:
+            self.parts.append(html.escape(text, quote=False))
+
+    def markup(self, markup):
+        self.parts.append(markup)
+
+    #A cross reference to a Doxygen id, kindref is "compound" or "member"
+    def ref(self, refid, kindref, text):
+        self.parts.append((refid, kindref, html.escape(text, quote=False)))
+
+    #Resolves all the cross references with the DoxygenLinkIndex and returns the finished text
+    def join(self, fromPage, linkIndex):
+        strs = []
+        for part in self.parts:
+            if isinstance(part, str):
+                strs.append(part)
+                continue
+
+            refid, kindref, text = part
+            #Member ids are the id of the compound they're documented in, "_1" and their anchor
+            fragment = ""
+            if kindref == "member" and "_1" in refid:
+                refid, anchor = refid.rsplit("_1", 1)
+                fragment = "#" + anchor
+            link = refid + ".xml"
+            title = linkIndex.resolve(fromPage, link + fragment, link, fragment)
+            if title:
+                strs.append("[[" + title + fragment + "|" + text + "]]")
+            else:
+                strs.append(text)
+        return "".join(strs)
+
+#Renders a description (or any other bit of Doxygen XML markup) into fragments
+def renderXML(elem, fragments):
+    tag = elem.tag
+    if tag == "ref":
+        fragments.ref(elem.get("refid"), elem.get("kindref"), "".join(elem.itertext()))
+        return
+    elif tag == "ulink":
+        fragments.markup("[" + elem.get("url") + " ")
+        fragments.text("".join(elem.itertext()))
+        fragments.markup("]")
+        return
+    elif tag == "sp":
+        fragments.markup(" ")
+        return
+    elif tag == "linebreak":
+        fragments.markup("<br>")
+        return
+
+    start, end = simpleTags.get(tag, ("", ""))
+    if tag == "simplesect":
+        kind = elem.get("kind")
+        start = "<dl><dt>" + simplesectTitles.get(kind, kind.capitalize()) + "</dt><dd>"
+        end = "</dd></dl>"
+
+    fragments.markup(start)
+    fragments.text(elem.text)
+    for child in elem:
+        renderXML(child, fragments)
+        fragments.text(child.tail)
+    fragments.markup(end)
+
+#A DoxygenHTMLPage read from a compound of Doxygen's XML output instead
+#Everything is kept as XMLFragments until convert resolves the cross references
+class DoxygenXMLPage(DoxygenHTMLPage):
+    __slots__ = ()
+    
+    #Languages whose scopes Doxygen writes with "." in HTML titles (the XML always uses "::")
+    dotLanguages = ("C#", "Java", "Python", "VHDL", "Fortran")
+
+    #The XML is already read a member at a time without building a tree, there's nothing cheaper
+    @staticmethod
+    def scan(fp, fn):
+        return None
+    
+    #Reads the compound at self.filepath, streaming one member at a time
+    def extract(self):
+        self.data = {
+            "nav" : [],
+            "summary" : [],
+            "contents" : XMLFragments(),
+            "footer" : XMLFragments()
+        }
+        title = None
+        language = None
+        version = ""
+        description = XMLFragments()
+        inherits = XMLFragments()
+        inner = XMLFragments()
+        decls = XMLFragments()
+        details = XMLFragments()
+        sectionKind = None
+        memberDepth = 0
+
+        path = self.filepath + "/" + self.filename
+        for event, elem in ElementTree.iterparse(path, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                if tag == "doxygen":
+                    version = elem.get("version", "")
+                elif tag == "compounddef":
+                    language = elem.get("language")
+                elif tag == "sectiondef":
+                    sectionKind = elem.get("kind")
+                    sectionTitle = sectionTitles.get(sectionKind, sectionKind.replace("-", " ").title())
+                    decls.markup("<h2><span id=\"" + sectionKind + "\">" + html.escape(sectionTitle) + "</span></h2><table class=\"memberdecls\">")
+                    self.data["summary"].append("[[#" + sectionKind + "|" + html.escape(sectionTitle) + "]]")
+                    self.anchors.add(sectionKind)
+                elif tag == "memberdef":
+                    memberDepth += 1
+                continue
+
+            if tag == "memberdef":
+                self.extractMember(elem, decls, details)
+                memberDepth -= 1
+                elem.clear()
+            elif memberDepth > 0:
+                continue #Handled with the whole memberdef
+            elif tag == "compoundname":
+                title = elem.text
+            elif tag in ("briefdescription", "detaileddescription"):
+                renderXML(elem, description)
+                elem.clear()
+            elif tag in ("basecompoundref", "derivedcompoundref"):
+                inherits.markup("<div>" + ("Inherits " if tag == "basecompoundref" else "Inherited by "))
+                if elem.get("refid"):
+                    inherits.ref(elem.get("refid"), "compound", elem.text or "")
+                else:
+                    inherits.text(elem.text)
+                inherits.markup("</div>")
+            elif tag in ("innerclass", "innernamespace"):
+                name = elem.text or ""
+                if language in DoxygenXMLPage.dotLanguages:
+                    name = name.replace("::", ".")
+                inner.markup("<li>")
+                inner.ref(elem.get("refid"), "compound", name)
+                inner.markup("</li>")
+            elif tag == "sectiondef":
+                decls.markup("</table>")
+                sectionKind = None
+
+        if not title:
+            raise doxymwglobal.DoxyMWException("No compoundname in doxygen document to create MediaWiki page in " + self.filename)
+        if language in DoxygenXMLPage.dotLanguages:
+            title = title.replace("::", ".")
+        self.data["title"] = title
+        self.setTitle(title)
+
+        #Put it all together in the same order as Doxygen's HTML
+        contents = self.data["contents"]
+        contents.parts.extend(inherits.parts)
+        if len(inner.parts) > 0:
+            contents.markup("<ul>")
+            contents.parts.extend(inner.parts)
+            contents.markup("</ul>")
+        contents.parts.extend(decls.parts)
+        contents.markup("<h2>Detailed Description</h2>")
+        contents.parts.extend(description.parts)
+        contents.parts.extend(details.parts)
+        self.data["footer"].text("Generated by Doxygen " + version + " ")
+
+    #Adds a single memberdef to the declarations and details
+    def extractMember(self, elem, decls, details):
+        anchor = elem.get("id").rsplit("_1", 1)[-1]
+        self.anchors.add(anchor)
+
+        def renderChild(tag, fragments):
+            child = elem.find(tag)
+            if child is not None:
+                fragments.text(child.text)
+                for grandchild in child:
+                    renderXML(grandchild, fragments)
+                    fragments.text(grandchild.tail)
+
+        #Declaration row, links to the details below
+        decls.markup("<tr><td class=\"memItemLeft\">")
+        renderChild("type", decls)
+        decls.markup("</td><td class=\"memItemRight\">")
+        decls.ref(elem.get("id"), "member", elem.findtext("name", ""))
+        decls.text(elem.findtext("argsstring", ""))
+        decls.markup("</td></tr>")
+
+        #Details
+        details.markup("<span id=\"" + anchor + "\" style=\"width:0;height:0;font-size:0;\"></span>")
+        details.markup("<div class=\"memitem\"><div class=\"memproto\">")
+        details.text(elem.findtext("definition", "") + elem.findtext("argsstring", ""))
+        details.markup("</div><div class=\"memdoc\">")
+        for tag in ("briefdescription", "detaileddescription"):
+            child = elem.find(tag)
+            if child is not None:
+                renderXML(child, details)
+        details.markup("</div></div>")
+
+    #Resolves all the cross references now that all the pages are known
+    def convert(self, linkIndex):
+        self.data["contents"] = self.data["contents"].join(self, linkIndex)
+        self.data["footer"] = self.data["footer"].join(self, linkIndex)